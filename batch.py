@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+'''
+batch.py: Runs the full membership analysis for every open cluster of a cluster catalog
+
+          The catalog is a table of cluster names, centers (ra, dec in degrees) and search radii
+          (arcmin). The raw GAIA data of a cluster is either its own file in a raw data directory or
+          a cone cut of one large catalog around its center. Every cluster goes through error
+          removal, DBSCAN, sigma clipping, MST membership and covering radius in a worker process,
+          with the MST starting vertex and the center derived from the data. One membership table
+          is written per cluster, plus a summary table with a row for every cluster.
+'''
+
+# imports
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+from pipeline import Pipeline, CACHE_DIR
+from columnar import is_columnar, load_table, save_table
+from sky import ConeIndex
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+CATALOG_COLUMNS = ['name', 'ra', 'dec', 'radius']
+STAGE_NAMES = ['err_rm', 'reduced', 'stat_adj', 'vpd_adj', 'final']
+_catalog = dict()  # large raw catalog and its cone index shared by the workers
+
+# raw data of one cluster, from its own file or from a cone cut of the large catalog
+def cluster_data(cluster, raw_dir=None):
+    if raw_dir is not None:
+        for path in [os.path.join(raw_dir, cluster['name']), os.path.join(raw_dir, f'{cluster["name"]}.csv')]:
+            if is_columnar(path) or os.path.isfile(path):
+                return load_table(path)
+        raise FileNotFoundError(f'no raw data for {cluster["name"]} in {raw_dir}')
+    rows = _catalog['index'].cone(cluster['ra'], cluster['dec'], cluster['radius'])
+    return _catalog['table'].iloc[rows].reset_index(drop=True)
+
+# runs every stage for one cluster and writes its membership table
+def run_cluster(cluster, raw_dir, out_dir, cache_dir):
+    summary = {col: cluster[col] for col in CATALOG_COLUMNS}
+    try:
+        raw = cluster_data(cluster, raw_dir)
+        summary['raw'] = len(raw)
+        params = {'START_ID': None, 'MAX_RAD': cluster['radius']}
+        results = Pipeline(cache_dir=cache_dir).run({'raw': raw}, params, targets=STAGE_NAMES)
+        for name in STAGE_NAMES:
+            summary[name] = len(results[name])
+
+        members = results['final']
+        save_table(members, os.path.join(out_dir, f'{cluster["name"]}.csv'))
+        summary['max_dist'] = members['dist'].max()
+        for col in ['ra', 'dec', 'pmra', 'pmdec', 'parallax']:
+            summary[f'mean_{col}'] = np.mean(members[col])
+        summary['status'] = 'ok'
+    except Exception as e:  # one failing cluster must not stop the batch
+        summary['status'] = f'{type(e).__name__}: {e}'
+    return summary
+
+# keeps the large raw catalog and its cone index in a worker process
+def _attach(path):
+    if path is not None:
+        _catalog['table'] = load_table(path)
+        _catalog['index'] = ConeIndex(_catalog['table']['ra'], _catalog['table']['dec'])
+
+def _run(args):
+    return run_cluster(*args)
+
+# processes every cluster of a catalog across a pool of worker processes
+def run_batch(catalog, out_dir, raw_dir=None, raw_catalog=None, processes=None, cache_dir=CACHE_DIR):
+    if (raw_dir is None) == (raw_catalog is None):
+        raise ValueError('exactly one of raw_dir and raw_catalog is needed')
+    os.makedirs(out_dir, exist_ok=True)
+    clusters = catalog[CATALOG_COLUMNS].to_dict('records')
+    tasks = [(cluster, raw_dir, out_dir, cache_dir) for cluster in clusters]
+    with Pool(processes, initializer=_attach, initargs=(raw_catalog,)) as pool:
+        rows = list(pool.imap_unordered(_run, tasks))
+
+    # summary rows in catalog order
+    order = {cluster['name']: i for i, cluster in enumerate(clusters)}
+    summary = pd.DataFrame(sorted(rows, key=lambda row: order[row['name']]))
+    summary = summary.astype({name: 'Int64' for name in ['raw'] + STAGE_NAMES if name in summary})
+    summary.to_csv(os.path.join(out_dir, 'summary.csv'), index=False)
+    return summary
+
+# main function
+def main():
+    parser = argparse.ArgumentParser(description='Run the membership analysis for a catalog of clusters')
+    parser.add_argument('catalog', help='CSV with the columns ' + ', '.join(CATALOG_COLUMNS))
+    parser.add_argument('out', help='output directory for the membership and summary tables')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--raw-dir', help='directory with one raw GAIA file per cluster name')
+    source.add_argument('--raw-catalog', help='one large raw GAIA catalog that is cone searched')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (every core by default)')
+    args = parser.parse_args()
+
+    catalog = pd.read_csv(args.catalog)
+    summary = run_batch(catalog, args.out, args.raw_dir, args.raw_catalog, args.processes)
+    print(f'Clusters processed: {(summary["status"] == "ok").sum()} of {len(summary)}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+
+'''
+benchmark.py: Scaling benchmarks and correctness checks of the data reduction stages
+
+              Synthetic catalogs with the columns of err_rm.csv are generated at any size: a Gaussian
+              cluster in the sky, the Vector Point Diagram (VPD), parallax and the color magnitude
+              diagram over a uniform field, with magnitude dependent errors and a few missing values.
+              Every stage is run on the catalog of each size, once for the wall and CPU time and once
+              under tracemalloc for the peak memory, and stages whose cost grows too fast are capped
+              at a largest size. The correctness checks compare the stages with the reference
+              implementations they replaced (complete graph Prim, per-window linear regressions,
+              scikit-learn DBSCAN and nearest neighbours) on small catalogs, and when Numba is used
+              the compiled kernels are checked against the NumPy code (the check is skipped without
+              Numba or with USE_NUMBA=0). Results and checks are written to a JSON file so that runs
+              can be compared.
+'''
+
+# imports
+import argparse
+import heapq as hq
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from math import atan, pi, sqrt
+from sklearn.cluster import DBSCAN
+from sklearn.linear_model import LinearRegression
+from sklearn.neighbors import NearestNeighbors
+import clean
+import core
+import data_reductions
+import db
+import kernels
+import mst
+import radius
+from columnar import GAIA_SCHEMA, column_types
+from emst import average_length, candidate_edges, euclidean_mst
+from linkage import single_linkage
+from sky import angular_separation, central_star
+from sweep import nested_sweep
+from transition import ALPHA_MAX, DELTA, inclination_angle, normalize
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+SIZES = [1000, 10000, 100000, 1000000]
+SEED = 2021
+CLUSTER_FRACTION = 0.3
+CHECK_SIZE = 1000  # catalog size of the correctness checks
+RADIUS_CHECK_SIZE = 300  # the reference radius sweep builds a complete graph per radius
+COLUMNS = ['source_id', 'ra', 'ra_error', 'dec', 'dec_error', 'parallax', 'parallax_error', 'pm', 'pmra',
+           'pmra_error', 'pmdec', 'pmdec_error', 'parallax_pmra_corr', 'parallax_pmdec_corr', 'pmra_pmdec_corr',
+           'phot_g_mean_mag', 'bp_rp']
+
+# synthetic catalog of n stars with the columns and types of err_rm.csv
+def synthetic_catalog(n, seed=SEED, cluster_fraction=CLUSTER_FRACTION):
+    rng = np.random.default_rng(seed)
+    member = rng.random(n) < cluster_fraction
+    ra0, dec0 = 345.65, 59.55  # center of the cluster (deg)
+
+    # sky: gaussian cluster of 0.1 deg over a 2 x 2 deg field
+    ra = np.where(member, rng.normal(ra0, 0.1 / np.cos(np.radians(dec0)), n),
+                  ra0 + rng.uniform(-1, 1, n) / np.cos(np.radians(dec0)))
+    dec = np.where(member, rng.normal(dec0, 0.1, n), dec0 + rng.uniform(-1, 1, n))
+
+    # VPD and parallax: tight cluster over a broad field
+    pmra = np.where(member, rng.normal(-2.7, 0.25, n), rng.normal(-2., 3., n))
+    pmdec = np.where(member, rng.normal(-1.6, 0.25, n), rng.normal(-2.5, 3., n))
+    parallax = np.where(member, rng.normal(0.33, 0.03, n), rng.gamma(2., 0.15, n))
+
+    # photometry: a main sequence for the cluster and a broad field, errors grow with magnitude
+    g = 10 + 9 * rng.random(n) ** 0.6
+    bp_rp = np.where(member, 0.4 + 0.12 * (g - 10) + rng.normal(0, 0.05, n), rng.uniform(0.2, 3., n))
+    scale = 0.01 * 10 ** (0.2 * (g - 10))
+    df = pd.DataFrame({
+        'source_id': np.sort(rng.choice(np.iinfo(np.int64).max // 2, n, replace=False)),
+        'ra': ra,
+        'ra_error': scale * rng.uniform(0.5, 1.5, n),
+        'dec': dec,
+        'dec_error': scale * rng.uniform(0.5, 1.5, n),
+        'parallax': parallax,
+        'parallax_error': scale * rng.uniform(1, 2, n),
+        'pm': np.hypot(pmra, pmdec),
+        'pmra': pmra,
+        'pmra_error': scale * rng.uniform(1, 2, n),
+        'pmdec': pmdec,
+        'pmdec_error': scale * rng.uniform(1, 2, n),
+        'parallax_pmra_corr': rng.uniform(-0.5, 0.5, n),
+        'parallax_pmdec_corr': rng.uniform(-0.5, 0.5, n),
+        'pmra_pmdec_corr': rng.uniform(-0.5, 0.5, n),
+        'phot_g_mean_mag': g,
+        'bp_rp': bp_rp,
+    })[COLUMNS]
+    df.loc[rng.random(n) < 0.01, 'bp_rp'] = np.nan  # incomplete rows for the error removal
+    return df.astype(column_types(COLUMNS, GAIA_SCHEMA))
+
+# row of the star closest to the median VPD position, a cheap stand in for the densest star
+def start_row(df):
+    pmra = np.asarray(df['pmra'], dtype=float)
+    pmdec = np.asarray(df['pmdec'], dtype=float)
+    return int(np.argmin(np.hypot(pmra - np.median(pmra), pmdec - np.median(pmdec))))
+
+# inputs shared by the stages of one catalog, computed when a stage first needs them
+class Inputs:
+    def __init__(self, df):
+        self.df = df
+        self.start = start_row(df)
+        self.start_id = df['source_id'].iloc[self.start]
+        self._curve = None
+
+    # normalized average length curve of the VPD spanning tree
+    def curve(self):
+        if self._curve is None:
+            _, _, _, avglen = euclidean_mst(self.df['pmra'], self.df['pmdec'], self.start)
+            self._curve = normalize(avglen)
+        return self._curve
+
+# (name, untimed setup of the inputs or None, timed function of the inputs, largest size or None)
+STAGES = [
+    ('clean', None, lambda inp: clean.clean(inp.df), None),
+    ('select_cluster', None, lambda inp: db.select_cluster(inp.df), None),
+    ('sigma_clip', None, lambda inp: data_reductions.sigma_clip(inp.df), None),
+    ('candidate_edges', None, lambda inp: candidate_edges(inp.df['pmra'], inp.df['pmdec']), None),
+    ('spanning_tree', None, lambda inp: core.spanning_tree(inp.df['pmra'], inp.df['pmdec'], inp.start), None),
+    ('euclidean_mst', None, lambda inp: euclidean_mst(inp.df['pmra'], inp.df['pmdec'], inp.start), None),
+    ('inclination_angle', Inputs.curve,
+     lambda inp: inclination_angle(round(3 * sqrt(len(inp.curve()[0]))), *inp.curve()), None),
+    ('densest_star', None, lambda inp: mst.densest_star(inp.df), None),
+    ('select_members', None, lambda inp: mst.select_members(inp.df), None),
+    ('radius_sweep', None, lambda inp: radius.sweep_radii(inp.df, processes=1), 100000),
+]
+
+# wall time, CPU time and result of a call, and its peak traced memory when memory is set
+def measure(func, memory=True):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    result = func()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    peak = None
+    if memory:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return (result, wall, cpu, peak)
+
+# times and profiles every stage at every size
+def run_benchmarks(sizes=SIZES, stages=None, memory=True, seed=SEED, log=print):
+    results = list()
+    for n in sizes:
+        inputs = Inputs(synthetic_catalog(n, seed))
+        for name, setup, func, largest in STAGES:
+            if stages and name not in stages:
+                continue
+            entry = {'stage': name, 'n': n}
+            if largest is not None and n > largest:
+                entry['status'] = f'skipped above {largest}'
+            else:
+                try:
+                    if setup is not None:
+                        setup(inputs)
+                    result, entry['wall'], entry['cpu'], entry['peak_bytes'] = measure(lambda: func(inputs), memory)
+                    entry['rows'] = len(result) if isinstance(result, pd.DataFrame) else None
+                    entry['status'] = 'ok'
+                except Exception as e:
+                    entry['status'] = f'{type(e).__name__}: {e}'
+            log(f'{name:>18} {n:>8} {entry.get("wall", float("nan")):10.3f}s {entry["status"]}')
+            results.append(entry)
+    return results
+
+# reference implementations replaced by the current stages
+
+def _reference_graph(df):
+    graph = dict()
+    pmra = np.array(df['pmra'], dtype=float)
+    pmdec = np.array(df['pmdec'], dtype=float)
+    ids = np.array(df['source_id'])
+    for i in range(len(df)):
+        for j in range(i + 1, len(df)):
+            weight = sqrt((pmra[i] - pmra[j]) ** 2. + (pmdec[i] - pmdec[j]) ** 2.)
+            graph.setdefault(ids[i], {})[ids[j]] = weight
+            graph.setdefault(ids[j], {})[ids[i]] = weight
+    return graph
+
+def _reference_prim(graph, start):
+    visited = set([start])
+    edges = [(cost, start, to) for to, cost in graph[start].items()]
+    hq.heapify(edges)
+    count = curr_cost = 0
+    avglen = [0]
+    while edges:
+        cost, frm, to = hq.heappop(edges)
+        if to not in visited:
+            curr_cost += cost
+            count += 1
+            avglen.append(curr_cost / count)
+            visited.add(to)
+            for to_next, cost in graph[to].items():
+                if to_next not in visited:
+                    hq.heappush(edges, (cost, to, to_next))
+    return np.array(avglen)
+
+def _reference_dense_prim(x, y, start):
+    x = np.ascontiguousarray(x, dtype=float)
+    y = np.ascontiguousarray(y, dtype=float)
+    n = len(x)
+    best = np.full(n, np.inf)  # distance from each point to the tree
+    unvisited = np.ones(n, dtype=bool)
+    cost = np.zeros(n)
+    dist = np.empty(n)
+    closer = np.empty(n, dtype=bool)
+
+    u = start
+    unvisited[u] = False
+    for k in range(1, n):
+        # one vectorized relaxation of every unvisited point against the newest tree vertex
+        np.hypot(x - x[u], y - y[u], out=dist)
+        np.less(dist, best, out=closer)
+        closer &= unvisited
+        best[closer] = dist[closer]
+        u = np.argmin(best)
+        cost[k] = best[u]
+        best[u] = np.inf
+        unvisited[u] = False
+    return average_length(cost)
+
+def _reference_inclination(nmin, xvals, yvals):
+    vals, cangle, fangle = list(), list(), list()
+    model = LinearRegression()
+    for i in range(nmin, len(xvals) - nmin):
+        vals.append(i)
+        model.fit(np.array(xvals[i - nmin:i + 1]).reshape(-1, 1), np.array(yvals[i - nmin:i + 1]))
+        cangle.append(atan(model.coef_[0]) * 180 / pi)
+        model.fit(np.array(xvals[i:i + nmin + 1]).reshape(-1, 1), np.array(yvals[i:i + nmin + 1]))
+        fangle.append(atan(model.coef_[0]) * 180 / pi)
+    return (np.array(vals), np.array(cangle), np.array(fangle))
+
+def _reference_peak(graph, start):
+    normx, normlen = normalize(_reference_prim(graph, start))
+    _, cluster, field = _reference_inclination(round(3 * sqrt(len(normx))), normx, normlen)
+    if not len(cluster):
+        return 0.
+    return max((field - cluster) / np.maximum(cluster, DELTA) * (DELTA / ALPHA_MAX))
+
+def _reference_select_cluster(df, eps):
+    XS = db.standard_vpd(df)
+    labels = DBSCAN(eps=eps, min_samples=db.SAMPLE_SIZE).fit(XS).labels_
+    new_pmra = np.array(df['pmra'])[labels == 0]
+    return df[df['pmra'].isin(new_pmra)]
+
+def _reference_sigma_clip(df):
+    for col in ['pmra', 'pmdec', 'parallax']:
+        m = np.mean(df[col])
+        s = np.std(df[col])
+        df = df[(df[col] <= m + s) & (df[col] >= m - s)]
+    return df
+
+# correctness checks of the current stages against the reference implementations
+def run_checks(n=CHECK_SIZE, seed=SEED):
+    checks = list()
+    def check(name, passed, detail='', skipped=False):
+        checks.append({'check': name, 'n': n, 'passed': bool(passed), 'skipped': skipped, 'detail': detail})
+
+    df = clean.clean(synthetic_catalog(n, seed)).reset_index(drop=True)
+    inputs = Inputs(df)
+    graph = _reference_graph(df)
+    reference = _reference_prim(graph, inputs.start_id)
+
+    # spanning tree average lengths
+    _, _, _, avglen = euclidean_mst(df['pmra'], df['pmdec'], inputs.start)
+    check('euclidean_mst', np.allclose(avglen, reference), f'max diff {np.max(np.abs(avglen - reference)):.3g}')
+    dense = _reference_dense_prim(df['pmra'], df['pmdec'], inputs.start)
+    check('dense_prim', np.allclose(dense, reference))
+    tree = core.spanning_tree(df['pmra'], df['pmdec'], inputs.start)
+    check('spanning_tree', np.allclose(tree.avglen, reference))
+
+    # inclination angles
+    normx, normlen = normalize(reference)
+    nmin = round(3 * sqrt(len(normx)))
+    current = inclination_angle(nmin, normx, normlen)
+    expected = _reference_inclination(nmin, normx, normlen)
+    check('inclination_angle', all(np.allclose(a, b) for a, b in zip(current, expected)))
+
+    # k-distance knee and DBSCAN selection
+    XS = db.standard_vpd(df)
+    distances, _ = NearestNeighbors(n_neighbors=db.SAMPLE_SIZE).fit(XS).kneighbors(XS)
+    _, curve, kneedle = db.elbow(XS)
+    check('k_distance', np.allclose(curve, np.sort(distances, axis=0)[:, 1]))
+    selected = db.select_cluster(df)
+    expected = _reference_select_cluster(df, kneedle.knee_y)
+    check('select_cluster', np.array_equal(selected.index, expected.index),
+          f'{len(selected)} rows against {len(expected)}')
+
+    # sigma clipping
+    check('sigma_clip', np.array_equal(data_reductions.sigma_clip(df).index, _reference_sigma_clip(df).index))
+
+    # radius sweep against a complete graph spanning tree per radius
+    small = synthetic_catalog(RADIUS_CHECK_SIZE, seed + 1)
+    start = central_star(small['ra'], small['dec'])
+    dist = angular_separation(small['ra'], small['dec'], small['ra'].iloc[start], small['dec'].iloc[start])
+    radii = np.arange(0, radius.MAX_RAD + 0.2, 0.2)
+    tparam = nested_sweep(small['pmra'], small['pmdec'], dist, radii, start)
+    start_id = small['source_id'].iloc[start]
+    expected = list()
+    for rad in radii:
+        sample = small[dist < rad]
+        ok = len(sample) > 1 and start_id in set(sample['source_id'])
+        expected.append(_reference_peak(_reference_graph(sample), start_id) if ok else 0.)
+    check('radius_sweep', np.allclose(tparam, expected), f'n={RADIUS_CHECK_SIZE}')
+
+    # compiled kernels against the NumPy code, only when Numba compiles them (USE_NUMBA=1)
+    if kernels.JIT:
+        differ = [name for name, same in backend_parity(df['pmra'], df['pmdec'], inputs.start).items() if not same]
+        check('numba_parity', not differ, ', '.join(differ))
+    else:
+        check('numba_parity', True, 'Numba is not installed or USE_NUMBA=0', skipped=True)
+    return checks
+
+# whether the Numba kernels and the NumPy code give identical arrays, per kernel
+def backend_parity(x, y, start):
+    x = np.ascontiguousarray(x, dtype=float)
+    y = np.ascontiguousarray(y, dtype=float)
+    results = dict()
+    try:
+        for jit in (False, True):
+            kernels.JIT = jit
+            frm, to, weight = candidate_edges(x, y)
+            order, parent, cost, avglen = euclidean_mst(x, y, start)
+            normx, normlen = normalize(avglen)
+            results[jit] = {
+                'edge_lengths': [weight],
+                'heap_prim': [order, parent, cost],
+                'window_slopes': list(inclination_angle(round(3 * sqrt(len(normx))), normx, normlen)),
+                'single_linkage': list(single_linkage(len(x), parent[order[1:]], order[1:], start)),
+            }
+    finally:
+        kernels.JIT = True
+    return {name: all(np.array_equal(a, b) for a, b in zip(results[False][name], results[True][name]))
+            for name in results[True]}
+
+# main function
+def main():
+    # constants
+    OUTPUT = r'./benchmark.json'
+
+    parser = argparse.ArgumentParser(description='Benchmark the data reduction stages on synthetic catalogs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='catalog sizes')
+    parser.add_argument('--stages', nargs='+', choices=[name for name, _, _, _ in STAGES], help='stages to run')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    parser.add_argument('--no-checks', action='store_true', help='skip the correctness checks')
+    parser.add_argument('--seed', type=int, default=SEED, help='seed of the synthetic catalogs')
+    parser.add_argument('--output', default=OUTPUT, help='JSON file for the results')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+        },
+        'checks': list(),
+        'results': list(),
+    }
+    if not args.no_checks:
+        report['checks'] = run_checks(seed=args.seed)
+        for entry in report['checks']:
+            status = 'skipped' if entry['skipped'] else 'passed' if entry['passed'] else 'FAILED'
+            print(f'{entry["check"]:>30} {status} {entry["detail"]}')
+    report['results'] = run_benchmarks(args.sizes, args.stages, not args.no_memory, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    failed = [entry['check'] for entry in report['checks'] if not entry['passed']]
+    if failed:
+        sys.exit(f'failed checks: {", ".join(failed)}')
+
+if __name__ == '__main__':
+    main()
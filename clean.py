@@ -5,11 +5,14 @@ clean.py: Takes a CSV file and extracts a new CSV with statistical data reductio
 
           A dataframe is created from the CSV. The dataframe undergoes statistical data reductions
           for a certain ERROR_THRESHOLD. The reduced dataframe is then converted to a new CSV for
-          future use.
+          future use. Catalogs larger than memory can be streamed through the same filters in fixed
+          size chunks, with the number of rows rejected by each filter reported at the end.
 '''
 
 # imports
-import pandas as pd
+import argparse
+from columnar import load_table, save_table, read_chunks, TableWriter
+from instrument import instrumented
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -20,23 +23,63 @@ __maintainer__ = 'Rik Ghosh'
 __email__ = 'rikghosh487@gmail.com'
 __status__ = 'Production'
 
+# globals
+ERROR_THRESHOLD = 0.5
+CHUNKSIZE = 1 << 20  # rows per chunk when streaming
+
+# row filters in the order they are applied, each one keeps the rows where it is true
+PREDICATES = [
+    ('missing fields', lambda df, threshold: df.notna().all(axis=1)),
+    ('proper motion error', lambda df, threshold: (df['pmra_error'] < threshold) & (df['pmdec_error'] < threshold)),
+    ('position error', lambda df, threshold: (df['ra_error'] < threshold) & (df['dec_error'] < threshold)),
+    ('parallax', lambda df, threshold: df['parallax'] < threshold),
+]
+
+# drops incomplete rows and enforces the error threshold on the astrometry
+@instrumented('clean')
+def clean(df, threshold=ERROR_THRESHOLD):
+    for _, predicate in PREDICATES:
+        df = df[predicate(df, threshold)]
+    return df
+
+# cleans a catalog chunk by chunk and writes the surviving rows as it goes, memory stays bounded
+def stream_clean(src, dst, threshold=ERROR_THRESHOLD, chunksize=CHUNKSIZE):
+    rejected = {name: 0 for name, _ in PREDICATES}
+    kept = 0
+    with TableWriter(dst) as out:
+        for chunk in read_chunks(src, chunksize):
+            for name, predicate in PREDICATES:
+                mask = predicate(chunk, threshold)
+                rejected[name] += int((~mask).sum())
+                chunk = chunk[mask]
+            kept += len(chunk)
+            out.append(chunk)
+    return (kept, rejected)
+
 # main function
 def main():
     # constants
     FILENAME = r'./csv/raw_data.csv'
-    ERROR_THRESHOLD = 0.5
+    OUTPUT = r'./csv/err_rm.csv'
 
-    # dataframe creation
-    df = pd.read_csv(FILENAME)
-    df = df.dropna()
+    parser = argparse.ArgumentParser(description='Remove incomplete rows and rows with large errors')
+    parser.add_argument('--stream', action='store_true', help='process the catalog in fixed size chunks')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='rows per chunk when streaming')
+    args = parser.parse_args()
+
+    if args.stream:
+        kept, rejected = stream_clean(FILENAME, OUTPUT, chunksize=args.chunksize)
+        for name, count in rejected.items():
+            print(f'Rejected by {name}: {count}')
+        print(f'Remaining data points: {kept}')
+        return
 
-    # standard error removal
-    df = df[(df['pmra_error'] < ERROR_THRESHOLD) & (df['pmdec_error'] < ERROR_THRESHOLD)]
-    df = df[(df['ra_error'] < ERROR_THRESHOLD) & (df['dec_error'] < ERROR_THRESHOLD)]
-    df = df[df['parallax'] < ERROR_THRESHOLD]
+    # dataframe creation
+    df = load_table(FILENAME)
+    df = clean(df)
 
     # CSV creation
-    df.to_csv('./csv/err_rm.csv', index=False)
+    save_table(df, OUTPUT)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+'''
+columnar.py: Typed columnar storage for the intermediate tables of the pipeline
+
+             A table is stored as a directory with one NumPy (.npy) file per column, so a stage can
+             memory map only the columns it uses instead of parsing every field of a CSV. The column
+             types come from the datatype comments of the SQL queries in ./queries (the GAIA float
+             columns are 32 bit), which roughly halves the memory of the float64/int64 defaults.
+             CSV files are still accepted everywhere and are parsed with the same types. A table
+             whose rows were taken from another one also stores its index, the row positions in
+             the table the selection started from.
+'''
+
+# imports
+import argparse
+import os
+import re
+import numpy as np
+import pandas as pd
+from instrument import instrumented
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+QUERY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries')
+COLUMN_FILE = 'columns.txt'  # column order of a stored table
+INDEX_FILE = 'index.npy'  # row positions of a selection in its source table
+SQL_TYPES = {'long': np.int64, 'double': np.float64, 'float': np.float32, 'real': np.float32}
+
+# column types documented in the comments of an SQL query
+def query_schema(path):
+    schema = dict()
+    pattern = re.compile(r'^\s*(.+?),?\s*--.*datatype:\s*(\w+)')
+    with open(path) as f:
+        for line in f:
+            match = pattern.match(line)
+            if match:
+                expr, sqltype = match.groups()
+                name = expr.split(' AS ')[-1] if ' AS ' in expr else expr.split('.')[-1]
+                schema[name.strip()] = SQL_TYPES[sqltype.lower()]
+    return schema
+
+GAIA_SCHEMA = query_schema(os.path.join(QUERY_DIR, 'datafetch.sql'))
+SDSS_SCHEMA = {**query_schema(os.path.join(QUERY_DIR, 'sdss.sql')),
+               **query_schema(os.path.join(QUERY_DIR, 'training.sql'))}
+
+# dtype for each of the columns, float64 for columns missing from the schema
+def column_types(columns, schema=GAIA_SCHEMA):
+    return {col: schema.get(col, np.float64) for col in columns}
+
+# true when a path refers to a stored columnar table
+def is_columnar(path):
+    return os.path.isfile(os.path.join(path, COLUMN_FILE))
+
+# names of the columns of a stored table
+def table_columns(path):
+    with open(os.path.join(path, COLUMN_FILE)) as f:
+        return f.read().split()
+
+# stores a dataframe as one typed .npy file per column
+def write_table(df, path, schema=GAIA_SCHEMA):
+    os.makedirs(path, exist_ok=True)
+    types = column_types(df.columns, schema)
+    for col in df.columns:
+        np.save(os.path.join(path, f'{col}.npy'), np.ascontiguousarray(df[col], dtype=types[col]))
+    write_index(path, None if df.index.equals(pd.RangeIndex(len(df))) else df.index)
+    with open(os.path.join(path, COLUMN_FILE), 'w') as f:
+        f.write('\n'.join(df.columns) + '\n')
+
+# stores the row positions that a table was selected with, or removes them for a full table
+def write_index(path, rows):
+    if rows is not None:
+        np.save(os.path.join(path, INDEX_FILE), np.asarray(rows, dtype=np.int64))
+    elif os.path.isfile(os.path.join(path, INDEX_FILE)):
+        os.remove(os.path.join(path, INDEX_FILE))
+
+# stored row positions of a selected table, None for a full table
+def read_index(path):
+    if os.path.isfile(os.path.join(path, INDEX_FILE)):
+        return np.load(os.path.join(path, INDEX_FILE))
+    return None
+
+# reads the requested columns of a stored table as memory mapped arrays
+def read_table(path, columns=None, mmap=True):
+    columns = columns or table_columns(path)
+    mode = 'r' if mmap else None
+    data = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mode) for col in columns}
+    return pd.DataFrame(data, columns=columns, index=read_index(path), copy=False)
+
+# loads a table from a columnar directory or a CSV with only the requested columns and schema types
+@instrumented('load_table')
+def load_table(path, columns=None, schema=GAIA_SCHEMA):
+    if is_columnar(path):
+        return read_table(path, columns)
+    header = pd.read_csv(path, nrows=0).columns
+    types = column_types(columns or header, schema)
+    return pd.read_csv(path, usecols=columns, dtype=types)[list(columns or header)]
+
+# writes a table to a columnar directory or to a CSV depending on the destination name
+def save_table(df, path, schema=GAIA_SCHEMA):
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        write_table(df, path, schema)
+
+# writes the selected rows (positions) of every column of a table without loading the rest of it
+def save_rows(src, rows, dst, schema=GAIA_SCHEMA):
+    rows = np.asarray(rows)
+    if is_columnar(src) and not dst.endswith('.csv'):
+        os.makedirs(dst, exist_ok=True)
+        columns = table_columns(src)
+        for col in columns:
+            values = np.load(os.path.join(src, f'{col}.npy'), mmap_mode='r')
+            np.save(os.path.join(dst, f'{col}.npy'), values[rows])
+        index = read_index(src)
+        write_index(dst, rows if index is None else index[rows])
+        with open(os.path.join(dst, COLUMN_FILE), 'w') as f:
+            f.write('\n'.join(columns) + '\n')
+    else:
+        save_table(load_table(src, schema=schema).iloc[rows], dst, schema)
+
+# yields a table in chunks of rows from a columnar directory or a CSV, with schema types
+def read_chunks(path, chunksize, columns=None, schema=GAIA_SCHEMA):
+    if is_columnar(path):
+        table = read_table(path, columns)
+        for start in range(0, len(table), chunksize):
+            yield table.iloc[start:start + chunksize].copy()
+        return
+    header = pd.read_csv(path, nrows=0).columns
+    types = column_types(columns or header, schema)
+    for chunk in pd.read_csv(path, usecols=columns, dtype=types, chunksize=chunksize):
+        yield chunk[list(columns or header)]
+
+# appends dataframe chunks to a CSV or a columnar table without holding the whole table
+class TableWriter:
+    def __init__(self, path, schema=GAIA_SCHEMA):
+        self.path = path
+        self.schema = schema
+        self.columns = None
+        self.types = None
+        self.rows = 0
+        self.parts = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # writes the rows of a chunk at the end of the table
+    def append(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self.types = column_types(self.columns, self.schema)
+            if self.path.endswith('.csv'):
+                df.iloc[:0].to_csv(self.path, index=False)
+            else:
+                os.makedirs(self.path, exist_ok=True)
+                self.parts = {col: open(self._part(col), 'wb') for col in self.columns}
+        if self.path.endswith('.csv'):
+            df.to_csv(self.path, mode='a', header=False, index=False)
+        else:
+            for col in self.columns:
+                self.parts[col].write(np.ascontiguousarray(df[col], dtype=self.types[col]).tobytes())
+        self.rows += len(df)
+
+    # finishes the .npy files from the raw column data written so far
+    def close(self):
+        for col, part in self.parts.items():
+            part.close()
+            dtype = np.dtype(self.types[col])
+            with open(os.path.join(self.path, f'{col}.npy'), 'wb') as f, open(self._part(col), 'rb') as raw:
+                header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                          'shape': (self.rows,)}
+                np.lib.format.write_array_header_2_0(f, header)
+                for block in iter(lambda: raw.read(1 << 20), b''):
+                    f.write(block)
+            os.remove(self._part(col))
+        if self.parts:
+            with open(os.path.join(self.path, COLUMN_FILE), 'w') as f:
+                f.write('\n'.join(self.columns) + '\n')
+        self.parts = dict()
+
+    def _part(self, col):
+        return os.path.join(self.path, f'{col}.part')
+
+# converts a CSV to a columnar table in fixed size chunks so that memory stays bounded
+def convert_csv(src, dst, schema=GAIA_SCHEMA, chunksize=1 << 20):
+    columns = list(pd.read_csv(src, nrows=0).columns)
+    types = column_types(columns, schema)
+    with open(src) as f:
+        nrows = sum(1 for _ in f) - 1
+
+    os.makedirs(dst, exist_ok=True)
+    arrays = {col: np.lib.format.open_memmap(os.path.join(dst, f'{col}.npy'), mode='w+',
+                                             dtype=types[col], shape=(nrows,)) for col in columns}
+    start = 0
+    for chunk in pd.read_csv(src, dtype=types, chunksize=chunksize):
+        for col in columns:
+            arrays[col][start:start + len(chunk)] = chunk[col].to_numpy()
+        start += len(chunk)
+    for values in arrays.values():
+        values.flush()
+    with open(os.path.join(dst, COLUMN_FILE), 'w') as f:
+        f.write('\n'.join(columns) + '\n')
+
+# main function
+def main():
+    parser = argparse.ArgumentParser(description='Convert a CSV catalog to a typed columnar table')
+    parser.add_argument('src', help='CSV file')
+    parser.add_argument('dst', help='output directory')
+    parser.add_argument('--sdss', action='store_true', help='use the SDSS query types')
+    args = parser.parse_args()
+    convert_csv(args.src, args.dst, SDSS_SCHEMA if args.sdss else GAIA_SCHEMA)
+
+if __name__ == '__main__':
+    main()
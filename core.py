@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+'''
+core.py: Array in, array out interface of the analysis shared by the MST, radius and Monte Carlo scripts
+
+         The Vector Point Diagram (VPD) graph, the minimum spanning tree (MST) and its average edge
+         length curve, the sliding window inclination angles and the transition parameter are
+         computed here from plain arrays of proper motions and tree costs, without dataframes or
+         source_id lookups, so every script calls the same code and an optimization only has to be
+         made once. Points are referred to by their position in the input arrays. A spanning tree
+         is kept as a SpanningTree with its Prim visit order, edge costs and parent links, so the
+         members before any cutoff are a slice of the visit order, and it is saved to and loaded
+         from an npz file instead of being built again. The loops run as Numba kernels when Numba
+         is installed and as NumPy otherwise (see kernels.py), with the same results either way;
+         BACKEND tells which one is in use and benchmark.py checks the two against each other.
+         Arrays that every worker of a process pool reads are placed in shared memory once with
+         SharedArrays and mapped into the workers with attach_shared instead of being pickled.
+'''
+
+# imports
+import hashlib
+import numpy as np
+from multiprocessing import shared_memory
+from emst import euclidean_mst, average_length
+from transition import inclination_angle, transition_parameter, normalize, window_size, transition_scan
+import kernels
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+BACKEND = 'numba' if kernels.JIT else 'numpy'
+
+# minimum spanning tree grown by Prim's algorithm, with positions in the input arrays
+class SpanningTree:
+    def __init__(self, order, parent, cost, ids=None, key=None):
+        self.order = np.asarray(order, dtype=np.intp)  # visit order, order[0] is the start
+        self.parent = np.asarray(parent, dtype=np.intp)  # tree neighbour each point was reached from, -1 for the start
+        self.cost = np.asarray(cost, dtype=float)  # length of the edge that reached order[k], 0 for the start
+        self.avglen = average_length(self.cost)
+        self.ids = None if ids is None else np.asarray(ids)  # labels of the positions, e.g. source_id
+        self.key = key  # hash of the inputs the tree was built from
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def start(self):
+        return int(self.order[0])
+
+    # positions of the start and the first nt points visited after it, a view of the visit order
+    def members(self, nt):
+        return self.order[:nt + 1]
+
+    # labels of the members before the cutoff nt
+    def member_ids(self, nt):
+        return self.ids[self.members(nt)]
+
+    # tree edges (parent, child) and their lengths in visit order
+    def edges(self):
+        return (self.parent[self.order[1:]], self.order[1:], self.cost[1:])
+
+    # writes the tree to an npz file
+    def save(self, path):
+        arrays = {'order': self.order, 'parent': self.parent, 'cost': self.cost}
+        if self.ids is not None:
+            arrays['ids'] = self.ids
+        if self.key is not None:
+            arrays['key'] = np.array(self.key)
+        np.savez(path, **arrays)
+
+# spanning tree saved with SpanningTree.save, None when the file is missing or was built from other inputs
+def load_tree(path, key=None):
+    try:
+        with np.load(path) as data:
+            stored = str(data['key']) if 'key' in data else None
+            if key is not None and stored != key:
+                return None
+            return SpanningTree(data['order'], data['parent'], data['cost'],
+                                data['ids'] if 'ids' in data else None, stored)
+    except FileNotFoundError:
+        return None
+
+# hash of the proper motions and the start position a tree is built from
+def tree_key(pmra, pmdec, start):
+    h = hashlib.sha256()
+    for values in (pmra, pmdec):
+        h.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    h.update(str(int(start)).encode())
+    return h.hexdigest()
+
+# MST of the VPD from the start position
+def spanning_tree(pmra, pmdec, start):
+    order, parent, cost, _ = euclidean_mst(pmra, pmdec, start)
+    return SpanningTree(order, parent, cost)
+
+# window positions, cluster and field angles and transition parameter along an average length curve
+def transition_curve(avglen, nmin=None):
+    normx, normlen = normalize(avglen)
+    xvals, cangle, fangle = inclination_angle(window_size(len(normx)) if nmin is None else nmin, normx, normlen)
+    return (xvals, cangle, fangle, transition_parameter(cangle, fangle))
+
+# number of tree vertices before the transition point (its Nt) and the peak transition parameter
+def transition_point(avglen, nmin=None):
+    points, peaks = transition_scan(avglen, [window_size(len(avglen)) if nmin is None else nmin])
+    return (int(points[0]), float(peaks[0]))
+
+# Nmin, transition point and peak transition parameter of one average length curve for every Nmin factor
+def nmin_scan(avglen, factors):
+    nmins = np.array([window_size(len(avglen), factor) for factor in factors], dtype=np.int64)
+    points, peaks = transition_scan(avglen, nmins)
+    return (nmins, points, peaks)
+
+# float arrays copied to shared memory for the workers of a process pool, unlinked when the with block ends
+# entering gives the (block name, shape) of every array, which attach_shared maps in a worker
+class SharedArrays:
+    def __init__(self, arrays):
+        self.arrays = {name: np.ascontiguousarray(values, dtype=float) for name, values in arrays.items()}
+        self.blocks = dict()
+
+    def __enter__(self):
+        try:
+            for name, values in self.arrays.items():
+                self.blocks[name] = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                np.ndarray(values.shape, dtype=float, buffer=self.blocks[name].buf)[:] = values
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return {name: (block.name, self.arrays[name].shape) for name, block in self.blocks.items()}
+
+    def __exit__(self, kind, value, traceback):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = dict()
+
+# maps the arrays of SharedArrays into a worker process as read-only views stored in shared
+def attach_shared(names, shared):
+    for name, (block, shape) in names.items():
+        block = shared_memory.SharedMemory(name=block)
+        values = np.ndarray(shape, dtype=float, buffer=block.buf)
+        values.flags.writeable = False
+        shared[name] = values
+        shared[name + '_block'] = block  # keeps the mapping alive
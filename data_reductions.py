@@ -9,8 +9,10 @@ data_reductions.py: Takes 1 standard deviation error margin for each of the 5 pa
 '''
 
 # imports
-import pandas as pd
 import numpy as np
+from columnar import load_table, save_rows
+from membership import as_rows, take
+from instrument import instrumented
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -21,30 +23,34 @@ __maintainer__ = 'Rik Ghosh'
 __email__ = 'rikghosh487@gmail.com'
 __status__ = 'Production'
 
+# globals
+COLUMNS = ['pmra', 'pmdec', 'parallax']  # columns used by the clipping
+
+# mask of the observations within 1 standard deviation of the mean pmra, pmdec and parallax
+# each column is clipped using the statistics of the rows kept by the previous ones
+def clip_mask(df):
+    mask = np.ones(len(df), dtype=bool)
+    for col in COLUMNS:
+        values = np.asarray(df[col])
+        m = np.mean(values[mask])
+        s = np.std(values[mask])
+        mask &= (values <= m + s) & (values >= m - s)
+    return mask
+
+# keeps the observations within 1 standard deviation of the mean pmra, pmdec and parallax
+@instrumented('sigma_clip')
+def sigma_clip(df):
+    return take(df, clip_mask(df))
+
 # main function
 def main():
     # constants
     FILENAME = r'./csv/reduced.csv'
 
     # dataframe
-    df = pd.read_csv(FILENAME)
-
-    # PMRA
-    m = np.mean(df['pmra'])
-    s = np.std(df['pmra'])
-    df = df = df[(df['pmra'] <= m + s) & (df['pmra'] >= m - s)]
-
-    # PMDEC
-    m = np.mean(df['pmdec'])
-    s = np.std(df['pmdec'])
-    df = df[(df['pmdec'] <= m + s) & (df['pmdec'] >= m - s)]
-
-    # PARALLAX
-    m = np.mean(df['parallax'])
-    s = np.std(df['parallax'])
-    df = df[(df['parallax'] <= m + s) & (df['parallax'] >= m - s)]
+    df = load_table(FILENAME, COLUMNS)
 
-    df.to_csv('./csv/stat_adj.csv', index=False)
+    save_rows(FILENAME, as_rows(clip_mask(df)), './csv/stat_adj.csv')
 
 if __name__ == '__main__':
     main()
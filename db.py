@@ -10,13 +10,15 @@ db.py: Takes a error reduced CSV and picks optimal cluster with noise removal.
 
 # imports
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
+from scipy.spatial import cKDTree
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import DBSCAN
-from scipy.stats import gaussian_kde
 from kneed import KneeLocator
+from gdbscan import GridDBSCAN
+from columnar import load_table, save_rows
+from membership import as_rows, take
+from instrument import instrumented
+import figures
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -27,41 +29,81 @@ __maintainer__ = 'Rik Ghosh'
 __email__ = 'rikghosh487@gmail.com'
 __status__ = 'Production'
 
+# globals
+SAMPLE_SIZE = 50
+NEIGHBOR_RANK = 1  # neighbour whose distance is used for the knee (0 is the point itself)
+KNEE_POINTS = None  # points of the k-distance curve given to the knee locator, None keeps every rank
+CHUNKSIZE = 1 << 16  # points per tree query
+COLUMNS = ['pmra', 'pmdec']  # columns used by the DBSCAN selection
+
+# standardized Vector Point Diagram (VPD) of a dataframe
+def standard_vpd(df):
+    X = np.vstack([np.array(df['pmra']), np.array(df['pmdec'])]).T
+    return StandardScaler().fit_transform(X)
+
+# distance of every point to its neighbour of the given rank, queried in chunks on all cores
+def k_distance(XS, rank=NEIGHBOR_RANK, chunksize=CHUNKSIZE):
+    tree = cKDTree(XS)
+    distances = np.empty(len(XS))
+    for start in range(0, len(XS), chunksize):
+        chunk = XS[start:start + chunksize]
+        distances[start:start + len(chunk)] = tree.query(chunk, k=[rank + 1], workers=-1)[0][:, 0]
+    return distances
+
+# sorted k-distance curve, at evenly spaced ranks found by partial selection when points is set
+# (coarse curves can move the knee, which lies in the far tail of the curve)
+def k_distance_curve(distances, points=KNEE_POINTS):
+    if points is None or len(distances) <= points:
+        return (np.arange(len(distances)), np.sort(distances))
+    ranks = np.unique(np.linspace(0, len(distances) - 1, points).round().astype(np.intp))
+    return (ranks, np.partition(distances, ranks)[ranks])
+
+# sorted nearest neighbour distances and the knee that is used as the DBSCAN eps
+def elbow(XS, rank=NEIGHBOR_RANK, points=KNEE_POINTS):
+    i, distances = k_distance_curve(k_distance(XS, rank), points)
+    kneedle = KneeLocator(i, distances, S=1, curve='convex', direction='increasing')
+    return (i, distances, kneedle)
+
+# grid DBSCAN over the standardized VPD with the eps taken from the knee
+@instrumented('dbscan')
+def vpd_dbscan(XS, eps, sample_size=SAMPLE_SIZE):
+    return GridDBSCAN(eps=eps, min_samples=sample_size).fit(XS)
+
+# keeps the stars of the densest VPD cluster
+@instrumented('select_cluster')
+def select_cluster(df, sample_size=SAMPLE_SIZE):
+    XS = standard_vpd(df)
+    _, _, kneedle = elbow(XS)
+    db = vpd_dbscan(XS, kneedle.knee_y, sample_size)
+    return take(df, db.labels_ == 0)
+
 # main function
 def main():
     # constants
     FILENAME = r'./csv/err_rm.csv'
-    SAMPLE_SIZE = 50
 
     # dataframe
-    df = pd.read_csv(FILENAME)
+    df = load_table(FILENAME, COLUMNS)
 
     # data extraction
     x = np.array(df['pmra'])
     y = np.array(df['pmdec'])
-    X = np.vstack([x, y]).T
-    XS = StandardScaler().fit_transform(X)
+    XS = standard_vpd(df)
 
     # knee determination
-    nei = NearestNeighbors(n_neighbors=SAMPLE_SIZE)
-    nei_fit = nei.fit(XS)
-    distances, _ = nei_fit.kneighbors(XS)
-    distances = np.sort(distances, axis=0)
-    distances = distances[:, 1]
-    i = np.arange(len(distances))
-    kneedle = KneeLocator(i, distances, S=1, curve='convex', direction='increasing')
+    i, distances, kneedle = elbow(XS)
     
     # plotting
-    plt.plot(distances)
+    plt.plot(i, distances)
     plt.axvline(kneedle.knee, color='red', linestyle='--', label='Elbow')
     plt.legend(loc='best')
     plt.xlabel('Datapoints')
     plt.ylabel(r'$\epsilon$')
     plt.title('Elbow Estimation for DBSCAN')
-    plt.show()
+    figures.show('db_elbow')
 
     # DBSCAN
-    db = DBSCAN(eps=kneedle.knee_y, min_samples=SAMPLE_SIZE).fit(XS)
+    db = vpd_dbscan(XS, kneedle.knee_y)
     core_samples_mask = np.zeros_like(db.labels_, dtype=bool)
     core_samples_mask[db.core_sample_indices_] = True
     c_labels = db.labels_
@@ -73,18 +115,16 @@ def main():
     print(f'Estimated number of noise data points: {n_noise}')
 
     # plotting
-    plt.scatter(x, y, c='indigo', marker='.', label='Original Data')
+    figures.scatter(x, y, c='indigo', marker='.', label='Original Data')
     plt.xlabel(r'$\mu_{\alpha*} cos(\delta)$' + ' (mas/yr)')
     plt.ylabel(r'$\mu_{\delta}$' + ' (mas/yr)')
     plt.title('Vector Point Diagram with DBSCAN selection')
-    plt.scatter(x[c_labels == 0], y[c_labels == 0], marker='.', c='salmon', label='DBSCAN selection')
+    figures.scatter(x[c_labels == 0], y[c_labels == 0], marker='.', c='salmon', label='DBSCAN selection')
     plt.legend(loc='best')
-    plt.show()
+    figures.show('db_vpd')
 
     # corresponding data extraction
-    new_pmra = x[c_labels == 0]
-    df = df[df['pmra'].isin(new_pmra)]
-    df.to_csv('./csv/reduced.csv', index=False)
+    save_rows(FILENAME, as_rows(c_labels == 0), './csv/reduced.csv')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+
+'''
+emst.py: Euclidean minimum spanning tree (MST) engine for the Vector Point Diagram (VPD)
+
+         The Euclidean MST of a set of points in the plane is a subgraph of their Delaunay
+         triangulation, so Prim's algorithm only needs the O(N) Delaunay edges instead of the
+         complete graph. Every edge that Prim's algorithm picks on the complete graph is the
+         shortest edge leaving the current tree, which is always an MST edge, so the visit order
+         and the edge costs are identical to a run over the complete graph (up to exact ties in
+         the edge lengths). Building the candidate edges costs O(N log N) time and O(N) memory.
+
+         For a growing prefix of a fixed sequence of points the candidate edges can instead be
+         found once for the whole sequence: every point is joined to the nearest earlier point in
+         each of SECTORS cones around it. An MST edge is the shortest edge from either of its
+         endpoints into a cone narrower than 60 degrees, so the MST of every prefix is contained in
+         the edges of the points of the prefix. On a tree, Prim's visit order needs no heap: every
+         vertex hangs below its nearest ancestor reached through a longer edge, and the preorder of
+         that tree with the shorter edges first is the visit order, which tree_order finds with
+         vectorized pointer jumping and a depth first traversal in scipy.
+'''
+
+# imports
+import heapq as hq
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import depth_first_order
+from scipy.spatial import Delaunay, cKDTree
+from instrument import instrumented
+import kernels
+try:
+    from scipy.spatial import QhullError
+except ImportError:  # scipy < 1.8
+    from scipy.spatial.qhull import QhullError
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+COPLANAR_NEIGHBORS = 8  # extra nearest neighbour edges for points Qhull leaves out of the triangulation
+SECTORS = 8  # cones around every point for the prefix candidate edges, each narrower than 60 degrees
+SECTOR_NEIGHBORS = 16  # nearest neighbours searched first for the earlier point in every cone
+SECTOR_SEARCH = 256  # largest neighbour search, points with cones still empty are compared to every earlier point
+SECTOR_CHUNK = 1 << 20  # point pairs of the exhaustive search per block
+
+# builds the candidate edges (i < j) and their lengths that are guaranteed to contain the Euclidean MST
+def candidate_edges(x, y):
+    points = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+    if len(points) < 2:
+        return (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+
+    # coincident points are joined to a single representative by zero length edges
+    n = len(points)
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    ordered = points[order]
+    same = np.zeros(n, dtype=bool)
+    same[1:] = (ordered[1:] == ordered[:-1]).all(axis=1)
+    first = order[np.maximum.accumulate(np.where(same, 0, np.arange(n)))]
+    frm = [first[same]]
+    to = [order[same]]
+
+    uniq = order[~same]
+    if len(uniq) > 1:
+        i, j = _unique_edges(points[uniq])
+        frm.append(uniq[i])
+        to.append(uniq[j])
+
+    frm = np.concatenate(frm)
+    to = np.concatenate(to)
+    keys = np.unique(np.minimum(frm, to).astype(np.int64) * n + np.maximum(frm, to))
+    lo = (keys // n).astype(np.intp)
+    hi = (keys % n).astype(np.intp)
+    if kernels.JIT:
+        weight = kernels.edge_lengths(points[:, 0], points[:, 1], lo, hi)
+    else:
+        weight = np.hypot(points[lo, 0] - points[hi, 0], points[lo, 1] - points[hi, 1])
+    return (lo, hi, weight)
+
+# delaunay edges between distinct points, with a fallback for collinear and tiny point sets
+def _unique_edges(points):
+    try:
+        if len(points) < 3:
+            raise QhullError('not enough points to triangulate')
+        tri = Delaunay(points)
+    except QhullError:
+        # degenerate (collinear) input: the MST is the chain of lexicographically sorted points
+        order = np.lexsort((points[:, 1], points[:, 0]))
+        return (order[:-1], order[1:])
+
+    simplices = tri.simplices
+    i = np.concatenate([simplices[:, 0], simplices[:, 1], simplices[:, 2]])
+    j = np.concatenate([simplices[:, 1], simplices[:, 2], simplices[:, 0]])
+
+    # near coincident points that were not triangulated get joined to their nearest neighbours
+    if len(tri.coplanar):
+        left = tri.coplanar[:, 0]
+        k = min(COPLANAR_NEIGHBORS + 1, len(points))
+        _, near = cKDTree(points).query(points[left], k=k)
+        near = near.reshape(len(left), -1)
+        i = np.concatenate([i, left, np.repeat(left, near.shape[1])])
+        j = np.concatenate([j, tri.coplanar[:, 2], near.ravel()])
+
+    keep = i != j
+    return (i[keep], j[keep])
+
+# compressed adjacency (CSR) lists for an undirected edge set
+def adjacency(n, frm, to, weight):
+    src = np.concatenate([frm, to])
+    dst = np.concatenate([to, frm])
+    wts = np.concatenate([weight, weight])
+    order = np.argsort(src, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return (indptr, dst[order], wts[order])
+
+# runs Prim's algorithm over the candidate edges and returns the visit order, parents, edge costs and average lengths
+@instrumented('euclidean_mst')
+def euclidean_mst(x, y, start):
+    frm, to, weight = candidate_edges(x, y)
+    order, parent, cost = prim(len(x), frm, to, weight, start)
+    return (order, parent, cost, average_length(cost))
+
+# Prim's algorithm with a heap over a sparse undirected edge set
+def prim(n, frm, to, weight, start):
+    indptr, dst, wts = adjacency(n, frm, to, weight)
+    if kernels.JIT:
+        return kernels.heap_prim(indptr, dst, wts, start)
+    dst = dst.tolist()
+    wts = wts.tolist()
+
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    order = [start]
+    parent = np.full(n, -1, dtype=np.intp)
+    cost = [0.]
+    edges = [(wts[k], start, dst[k]) for k in range(indptr[start], indptr[start + 1])]
+    hq.heapify(edges)
+
+    # graph loop for Prim's Algorithm
+    while edges:
+        c, u, v = hq.heappop(edges)
+        if not visited[v]:
+            visited[v] = True
+            order.append(v)
+            parent[v] = u
+            cost.append(c)
+            for k in range(indptr[v], indptr[v + 1]):
+                if not visited[dst[k]]:
+                    hq.heappush(edges, (wts[k], v, dst[k]))
+
+    return (np.array(order, dtype=np.intp), parent, np.array(cost))
+
+# cone of the direction from the points i to the points j
+def _sector(points, i, j):
+    angle = np.arctan2(points[j, 1] - points[i, 1], points[j, 0] - points[i, 0])
+    return np.minimum(((angle + np.pi) * (SECTORS / (2 * np.pi))).astype(np.intp), SECTORS - 1)
+
+# nearest earlier point in the cone of each pair (rows, cones), comparing the point to every earlier point
+def _exhaustive_sectors(points, rows, cones, chunksize=SECTOR_CHUNK):
+    frm = list()
+    to = list()
+    hi = int(rows.max(initial=0)) + 1
+    earlier = np.arange(hi)
+    step = max(chunksize // hi, 1)
+    for start in range(0, len(rows), step):
+        block = rows[start:start + step]
+        dist = np.hypot(points[:hi, 0] - points[block, 0][:, None], points[:hi, 1] - points[block, 1][:, None])
+        outside = (earlier >= block[:, None]) | (_sector(points, block[:, None], earlier) != cones[start:start + step, None])
+        dist[outside] = np.inf
+        nearest = np.argmin(dist, axis=1)
+        found = np.isfinite(dist[np.arange(len(block)), nearest])  # the cone is empty otherwise
+        frm.append(block[found])
+        to.append(nearest[found])
+    return (frm, to)
+
+# edges (i, j < i) from every point to the nearest earlier point in each cone around it, sorted by i, and their lengths
+# the MST of the first n points is contained in the edges with i < n
+def sector_edges(x, y, k=SECTOR_NEIGHBORS):
+    points = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+    n = len(points)
+    frm = [np.empty(0, dtype=np.intp)]
+    to = [np.empty(0, dtype=np.intp)]
+
+    # the points are searched in blocks of doubling size against a tree of every point up to the block
+    hi = 0
+    while hi < n:
+        lo, hi = hi, min(max(2 * hi, 4 * k), n)
+        tree = cKDTree(points[:hi])
+        pending = np.arange(lo, hi)
+        kk = min(k, hi)
+        while len(pending):
+            _, near = tree.query(points[pending], k=kk)
+            rows = np.repeat(pending, kk)
+            near = near.reshape(-1)
+            earlier = near < rows
+            rows, near = rows[earlier], near[earlier]
+
+            # the neighbours come nearest first, so the first one of every cone is the nearest in it
+            keys, first = np.unique((rows - lo) * SECTORS + _sector(points, rows, near), return_index=True)
+            filled = np.bincount(keys // SECTORS, minlength=hi - lo)[pending - lo]
+            done = (filled == SECTORS) | (kk == hi)  # a cone without a point among all of them is empty
+            last = 2 * kk > SECTOR_SEARCH and kk < hi
+            finished = np.isin(rows[first], pending[done]) | last
+            frm.append(rows[first[finished]])
+            to.append(near[first[finished]])
+            pending = pending[~done]
+            if last:
+                # points next to an empty cone, near the edge of the point set, search their empty cones
+                missing = np.ones((hi - lo) * SECTORS, dtype=bool)
+                missing[keys] = False
+                missing = missing.reshape(hi - lo, SECTORS)[pending - lo]
+                i, j = _exhaustive_sectors(points, np.repeat(pending, missing.sum(axis=1)), np.nonzero(missing)[1])
+                frm.extend(i)
+                to.extend(j)
+                break
+            kk = min(2 * kk, hi)
+
+    frm = np.concatenate(frm)
+    to = np.concatenate(to)
+    by_point = np.argsort(frm, kind='stable')
+    frm, to = frm[by_point], to[by_point]
+    return (frm, to, np.hypot(points[frm, 0] - points[to, 0], points[frm, 1] - points[to, 1]))
+
+# Prim's visit order of a tree from root, given the parent of every vertex (-1 at the root) and the length of its edge
+# equal lengths are ordered by parent and vertex, the order in which the heap of prim pops them
+def tree_order(parent, length, root):
+    n = len(parent)
+    up = np.where(parent < 0, root, parent)
+    by_length = np.lexsort((np.arange(n), up, np.where(np.arange(n) == root, -np.inf, length)))
+    rank = np.empty(n, dtype=np.intp)
+    rank[by_length] = np.arange(n)
+    above = rank.copy()
+    above[root] = n  # the root is longer than every edge, so the search below stops there
+
+    # nearest ancestor with a longer edge than every vertex, by binary lifting over ancestor blocks
+    jumps = [up]
+    longest = [above]
+    while not np.array_equal(jumps[-1], jumps[-1][jumps[-1]]):
+        jump = jumps[-1]
+        jumps.append(jump[jump])
+        longest.append(np.maximum(longest[-1], longest[-1][jump]))
+    hook = up.copy()
+    for jump, block in zip(reversed(jumps), reversed(longest)):
+        skip = block[hook] < rank
+        hook[skip] = jump[hook[skip]]
+
+    # preorder of the vertices below their hooks with the shorter edges first, on vertices numbered by rank
+    child = np.flatnonzero(np.arange(n) != root)
+    graph = csr_matrix((np.ones(len(child)), (rank[hook[child]], rank[child])), shape=(n, n))
+    graph.sort_indices()
+    return by_length[depth_first_order(graph, rank[root], directed=True, return_predecessors=False)]
+
+# average length of the tree edges after each iteration of Prim's algorithm
+def average_length(cost):
+    cost = np.asarray(cost, dtype=float)
+    avglen = np.zeros(len(cost))
+    avglen[1:] = np.cumsum(cost[1:]) / np.arange(1, len(cost))
+    return avglen
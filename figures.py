@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+'''
+figures.py: Shows the figures of the scripts or writes them to disk for unattended runs
+
+            When a figure directory is set (the FIGURE_DIR environment variable or configure) every
+            figure is saved there under its name with the non-interactive Agg backend instead of
+            opening a window, so runs on compute nodes never block. Independent figures can be drawn
+            in a pool of worker processes. Dense scatter layers are decimated on a grid of cells that
+            caps the points per cell, which thins the crowded cores while keeping the sparse outskirts,
+            and large layers are rasterized so vector files stay small.
+'''
+
+# imports
+import os
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from multiprocessing import Pool
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+FIGURE_DIR = os.environ.get('FIGURE_DIR')  # figures are written here instead of shown when set
+FIGURE_FORMAT = os.environ.get('FIGURE_FORMAT', 'png')
+DPI = 150
+MAX_POINTS = 50000  # largest number of points drawn by a scatter layer
+RASTER_POINTS = 5000  # scatter layers with more points are rasterized
+GRID = 256  # cells per axis of the decimation grid
+_settings = {'directory': None, 'fmt': FIGURE_FORMAT}
+
+# writes figures to a directory (or shows them again when directory is None)
+def configure(directory, fmt=FIGURE_FORMAT):
+    _settings['directory'] = directory
+    _settings['fmt'] = fmt
+    if directory is not None:
+        matplotlib.use('Agg')
+
+# true when figures are written to disk instead of shown
+def headless():
+    return _settings['directory'] is not None
+
+# saves a figure under its name in the figure directory and returns the path
+def save(name, fig=None):
+    fig = fig or plt.gcf()
+    os.makedirs(_settings['directory'], exist_ok=True)
+    path = os.path.join(_settings['directory'], f'{name}.{_settings["fmt"]}')
+    fig.savefig(path, dpi=DPI, bbox_inches='tight')
+    return path
+
+# shows the current figure, or saves and closes it in headless mode
+def show(name, fig=None):
+    if not headless():
+        plt.show()
+        return None
+    fig = fig or plt.gcf()
+    path = save(name, fig)
+    plt.close(fig)
+    return path
+
+# rows of at most max_points points (or one per occupied cell), taking the same number of random
+# points from every crowded cell
+def decimate(x, y, max_points=MAX_POINTS, bins=GRID, seed=0):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rows = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(rows) <= max_points:
+        return rows
+
+    # cell of every point
+    cells = np.zeros(len(rows), dtype=np.int64)
+    for values in [x[rows], y[rows]]:
+        span = np.ptp(values) or 1.
+        cells = cells * bins + np.clip(((values - values.min()) / span * bins).astype(np.int64), 0, bins - 1)
+
+    # largest number of points per cell that keeps at most max_points (at least one per cell)
+    counts = np.bincount(cells)
+    lo, hi = 1, int(counts.max())
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if np.minimum(counts, mid).sum() <= max_points:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    # random points of every cell up to the cap
+    perm = np.random.default_rng(seed).permutation(len(rows))
+    order = perm[np.argsort(cells[perm], kind='stable')]
+    rank = np.arange(len(rows)) - (np.cumsum(counts) - counts)[cells[order]]
+    return np.sort(rows[order[rank < lo]])
+
+# scatter layer that is decimated and rasterized when it is dense, c may hold one value per point
+def scatter(x, y, c=None, ax=None, **kwargs):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    rows = decimate(x, y)
+    if c is not None and np.ndim(c) == 1 and len(c) == len(x):
+        c = np.asarray(c)[rows]
+    ax = ax or plt.gca()
+    return ax.scatter(x[rows], y[rows], c=c, rasterized=len(rows) > RASTER_POINTS, **kwargs)
+
+# marker-only plot layer that is decimated and rasterized when it is dense
+def plot_points(x, y, fmt, ax=None, **kwargs):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    rows = decimate(x, y)
+    ax = ax or plt.gca()
+    return ax.plot(x[rows], y[rows], fmt, rasterized=len(rows) > RASTER_POINTS, **kwargs)
+
+# draws (name, func, args) figure jobs, in parallel worker processes when figures go to disk
+def render(jobs, processes=None):
+    if not headless() or processes == 1:
+        return [_render(job) for job in jobs]
+    with Pool(processes, initializer=configure, initargs=(_settings['directory'], _settings['fmt'])) as pool:
+        return pool.map(_render, jobs, chunksize=1)
+
+# draws one figure job on a new figure and shows or saves it
+def _render(job):
+    name, func, args = job
+    fig = plt.figure()
+    func(*args)
+    return show(name, fig)
+
+if FIGURE_DIR:
+    configure(FIGURE_DIR)
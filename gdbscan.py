@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+'''
+gdbscan.py: Grid accelerated DBSCAN for two dimensional data such as the Vector Point Diagram
+
+            The points are binned into square cells with a side of eps/sqrt(2), so any two points
+            of a cell are within eps of each other and every neighbour of a point lies in the 21
+            cells of the 5x5 block around its cell without the corners. A cell with min_samples
+            points is all core points, and a cell whose block holds fewer than min_samples points
+            has none, so exact distance checks are only needed for the remaining cells. They are
+            done over fixed size blocks of point pairs and no neighbour lists are kept, so memory
+            stays O(N). The clusters are the components of the core points joined by edges no
+            longer than eps, and since the Euclidean MST is part of the Delaunay triangulation it
+            is enough to take the connected components of the short Delaunay edges, which scipy
+            finds in one pass over the sparse graph. The labels follow
+            scikit-learn: clusters are numbered in order of their lowest core point and a border
+            point takes the lowest label among the clusters it touches.
+'''
+
+# imports
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from emst import candidate_edges
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+PAIR_CHUNK = 1 << 22  # point pairs checked per block
+OFFSETS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) < 4]
+
+# points of a subset grouped by the cell they fall in
+class _Grid:
+    def __init__(self, keys, points):
+        self.points = points[np.argsort(keys[points], kind='stable')]
+        self.keys, self.starts, self.counts = np.unique(keys[self.points], return_index=True,
+                                                        return_counts=True)
+
+    # positions of the cells with the given keys and a mask of the ones that exist
+    def lookup(self, keys):
+        pos = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        return (pos, self.keys[pos] == keys if len(self.keys) else np.zeros(len(keys), dtype=bool))
+
+# every pair of points (i from a, j from b) in neighbouring cells, in blocks of at most chunksize
+def _cell_pairs(a, b, stride, chunksize=PAIR_CHUNK):
+    for dx, dy in OFFSETS:
+        pos, hit = b.lookup(a.keys + dx * stride + dy)
+        acells = np.flatnonzero(hit)
+        bcells = pos[hit]
+        sizes = a.counts[acells] * b.counts[bcells]
+        ends = np.cumsum(sizes)
+        total = int(ends[-1]) if len(ends) else 0
+        for start in range(0, total, chunksize):
+            k = np.arange(start, min(start + chunksize, total))
+            cell = np.searchsorted(ends, k, side='right')
+            local = k - (ends[cell] - sizes[cell])
+            nb = b.counts[bcells[cell]]
+            yield (a.points[a.starts[acells[cell]] + local // nb],
+                   b.points[b.starts[bcells[cell]] + local % nb])
+
+# cluster of every core point from the edges (frm, to) between them, numbered in order of the lowest core point
+def _components(n, frm, to):
+    graph = coo_matrix((np.ones(len(frm), dtype=np.int8), (frm, to)), shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+    _, lowest = np.unique(component, return_index=True)
+    rank = np.empty(len(lowest), dtype=np.intp)
+    rank[np.argsort(lowest)] = np.arange(len(lowest))
+    return rank[component]
+
+# DBSCAN of two dimensional points with the scikit-learn fit interface
+class GridDBSCAN:
+    def __init__(self, eps=0.5, min_samples=5, chunksize=PAIR_CHUNK):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.chunksize = chunksize
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.ndim != 2 or X.shape[1] != 2:
+            raise ValueError(f'GridDBSCAN needs two dimensional points, got shape {X.shape}')
+        if self.eps <= 0:
+            raise ValueError(f'eps must be positive, got {self.eps}')
+        n = len(X)
+        eps2 = self.eps * self.eps
+
+        # cell of every point, the border of empty cells keeps neighbour keys from wrapping
+        side = self.eps / np.sqrt(2)
+        lower = X.min(axis=0) if n else np.zeros(2)
+        cells = np.floor((X - lower) / side).astype(np.int64) + 2
+        stride = int(cells[:, 1].max(initial=0)) + 3
+        keys = cells[:, 0] * stride + cells[:, 1]
+        grid = _Grid(keys, np.arange(n))
+
+        # points in the neighbouring cells, full cells are core and sparse blocks cannot be
+        block = np.zeros(len(grid.keys), dtype=np.int64)
+        for dx, dy in OFFSETS:
+            pos, hit = grid.lookup(grid.keys + dx * stride + dy)
+            block[hit] += grid.counts[pos[hit]]
+        full = np.repeat(grid.counts >= self.min_samples, grid.counts)
+        check = np.repeat(block >= self.min_samples, grid.counts) & ~full
+
+        # the other core points have at least min_samples points (themselves included) within eps
+        core = np.zeros(n, dtype=bool)
+        core[grid.points[full]] = True
+        counts = np.zeros(n, dtype=np.int64)
+        for i, j in _cell_pairs(_Grid(keys, grid.points[check]), grid, stride, self.chunksize):
+            near = ((X[i] - X[j]) ** 2).sum(axis=1) <= eps2
+            counts += np.bincount(i[near], minlength=n)
+        core |= counts >= self.min_samples
+        core_points = np.flatnonzero(core)
+        core_grid = _Grid(keys, core_points)
+
+        # clusters are the connected components of the core points over the short delaunay edges
+        frm = to = np.empty(0, dtype=np.intp)
+        if len(core_points) > 1:
+            frm, to, weight = candidate_edges(X[core_points, 0], X[core_points, 1])
+            near = weight <= self.eps
+            frm, to = frm[near], to[near]
+        labels = np.full(n, -1, dtype=np.intp)
+        labels[core_points] = _components(len(core_points), frm, to)
+
+        # border points take the lowest label of the core points within eps
+        border = np.full(n, np.iinfo(np.intp).max, dtype=np.intp)
+        for i, j in _cell_pairs(_Grid(keys, np.flatnonzero(~core)), core_grid, stride, self.chunksize):
+            near = ((X[i] - X[j]) ** 2).sum(axis=1) <= eps2
+            np.minimum.at(border, i[near], labels[j[near]])
+        reached = ~core & (border != np.iinfo(np.intp).max)
+        labels[reached] = border[reached]
+
+        self.core_sample_indices_ = core_points
+        self.components_ = X[core_points]
+        self.labels_ = labels
+        return self
+
+    def fit_predict(self, X):
+        return self.fit(X).labels_
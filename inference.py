@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+'''
+inference.py: Streams a photometric catalog through the stored metallicity model
+
+              The SDSS colors are read in chunks and scored in parallel worker processes that each
+              memory map the stored forest, while only a few chunks are in flight at a time. The
+              estimates are appended to the output table in input order as soon as their chunk is
+              done, and the cluster metallicity is summarized with running aggregates: the mean and
+              dispersion are merged chunk by chunk and the quantiles come from a fixed bin histogram
+              of [Fe/H], so memory stays flat for any catalog size.
+'''
+
+# imports
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from collections import deque
+from multiprocessing import Pool
+from columnar import SDSS_SCHEMA, read_chunks, TableWriter
+from train_obtain import FEATURES, TARGET, MODEL_DIR, latest_model, predict
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+CHUNKSIZE = 1 << 18  # rows per chunk
+FEH_RANGE = (-5., 2.)  # [Fe/H] range (dex) of the quantile histogram, values outside go to the end bins
+BIN_WIDTH = 0.001  # dex, the resolution of the quantiles
+QUANTILES = [0.05, 0.16, 0.5, 0.84, 0.95]
+_worker = dict()  # model loaded by each worker process
+
+# count, mean and dispersion of a stream of values, merged one batch at a time
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.  # sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+
+    # merges the statistics of a batch (Chan et al. parallel update)
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        count = self.count + len(values)
+        mean = values.mean()
+        delta = mean - self.mean
+        self.m2 += ((values - mean) ** 2).sum() + delta ** 2 * self.count * len(values) / count
+        self.mean += delta * len(values) / count
+        self.count = count
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else np.nan
+
+# fixed bin histogram of a stream of values for approximate quantiles
+class HistogramSketch:
+    def __init__(self, lo=FEH_RANGE[0], hi=FEH_RANGE[1], width=BIN_WIDTH):
+        self.lo = lo
+        self.width = width
+        self.counts = np.zeros(int(np.ceil((hi - lo) / width)), dtype=np.int64)
+
+    def update(self, values):
+        bins = np.clip(((np.asarray(values) - self.lo) / self.width).astype(np.int64), 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    # quantiles interpolated within their bins, accurate to the bin width inside the range
+    def quantile(self, q):
+        cum = np.cumsum(self.counts)
+        target = np.asarray(q) * cum[-1]
+        bins = np.minimum(np.searchsorted(cum, target, side='left'), len(cum) - 1)
+        below = cum[bins] - self.counts[bins]
+        frac = (target - below) / np.maximum(self.counts[bins], 1)
+        return self.lo + (bins + frac) * self.width
+
+# loads the stored model once in a worker process, single threaded since the workers are parallel
+def _attach(model_dir):
+    model = latest_model(model_dir)
+    model.n_jobs = 1
+    _worker['model'] = model
+
+def _score(colors):
+    return predict(_worker['model'], colors)
+
+# scores a color table chunk by chunk in worker processes and writes every star with its estimate
+def stream_predict(src, dst, model_dir=MODEL_DIR, processes=None, chunksize=CHUNKSIZE):
+    stats = RunningStats()
+    sketch = HistogramSketch()
+    inflight = 2 * (processes or os.cpu_count() or 1)  # chunks queued or being scored
+
+    with Pool(processes, initializer=_attach, initargs=(model_dir,)) as pool, \
+            TableWriter(dst, SDSS_SCHEMA) as out:
+        pending = deque()
+
+        # writes the oldest chunk once it is scored so the output keeps the input order
+        def finish():
+            chunk, result = pending.popleft()
+            feh = result.get()
+            out.append(chunk.assign(**{TARGET: feh}))
+            stats.update(feh)
+            sketch.update(feh)
+
+        for chunk in read_chunks(src, chunksize, schema=SDSS_SCHEMA):
+            chunk = chunk.dropna(subset=FEATURES)
+            if chunk.empty:  # no complete colors, the forest cannot score zero rows
+                out.append(chunk.assign(**{TARGET: np.empty(0)}))
+                continue
+            pending.append((chunk, pool.apply_async(_score, (chunk[FEATURES],))))
+            if len(pending) >= inflight:
+                finish()
+        while pending:
+            finish()
+
+        # an empty source still gives a table with the color and [Fe/H] columns
+        if out.columns is None:
+            out.append(pd.DataFrame({col: np.empty(0) for col in FEATURES + [TARGET]}))
+    return (stats, sketch)
+
+# main function
+def main():
+    parser = argparse.ArgumentParser(description='Estimate [Fe/H] for a large color table in chunks')
+    parser.add_argument('src', help='CSV or columnar table with the columns ' + ', '.join(FEATURES))
+    parser.add_argument('dst', help='output CSV or columnar directory with an added feh column')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (every core by default)')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='rows per chunk')
+    args = parser.parse_args()
+
+    stats, sketch = stream_predict(args.src, args.dst, processes=args.processes, chunksize=args.chunksize)
+    print(f'Stars: {stats.count}')
+    if not stats.count:
+        return
+    print(f'Cluster Metallicity: {stats.mean} (dispersion {stats.std()})')
+    for q, value in zip(QUANTILES, sketch.quantile(QUANTILES)):
+        print(f'Quantile {q}: {value:.3f}')
+
+if __name__ == '__main__':
+    main()
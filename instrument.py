@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+'''
+instrument.py: Records the cost of the pipeline stages and of the hot functions in a JSON trace
+
+               Every stage and hot function (table loads, error removal, DBSCAN, sigma clipping, the
+               VPD graph and spanning trees, the inclination angles, the radius sweep and the forest
+               training) is wrapped in a span that records its wall time, CPU time, the peak resident
+               set size of the process when it ends and the number of rows it received and returned.
+               A span costs about ten microseconds, so the spans stay on in every run. Spans nest, so a
+               pipeline stage shows the functions it called. The totals per name are always kept, the
+               individual spans up to MAX_SPANS. The trace is written as JSON when a trace file is
+               set (the TRACE_FILE environment variable, configure or --trace). A sampling profiler
+               can be attached to one named span (PROFILE_STAGE or --profile): a thread records the
+               call stack of the profiled thread at a fixed interval and the collapsed stacks are
+               added to the trace, ready for a flame graph. Work done in worker processes is only
+               seen as part of the span that started the pool.
+'''
+
+# imports
+import argparse
+import atexit
+import functools
+import json
+import os
+import resource
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+TRACE_FILE = os.environ.get('TRACE_FILE')  # the trace is written here at exit when set
+PROFILE_STAGE = os.environ.get('PROFILE_STAGE')  # name of the span that is sampled
+INTERVAL = 0.005  # seconds between profiler samples
+MAX_SPANS = 100000  # individual spans kept, the totals per name are always complete
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS and KiB elsewhere
+_state = {'path': TRACE_FILE, 'profile': PROFILE_STAGE, 'interval': INTERVAL, 'registered': False}
+_spans = list()
+_totals = dict()
+_profiles = dict()
+_local = threading.local()  # open spans of every thread
+
+# number of rows of a table, array, graph or tuple of them (the first one with a length)
+def rows(value):
+    if isinstance(value, (str, bytes)):  # paths
+        return None
+    if isinstance(value, tuple):
+        return next((n for n in map(rows, value) if n is not None), None)
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+# peak resident set size of the process in bytes
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+# collects the call stacks of one thread at a fixed interval while a span is open
+class Sampler(threading.Thread):
+    def __init__(self, thread_id, interval=INTERVAL, skip=0):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.skip = skip  # outer frames left out of the stacks, those that opened the span
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = list()
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            stack = stack[::-1][self.skip:]
+            if stack:
+                self.stacks[';'.join(stack)] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return self.stacks
+
+# number of frames in the stack of a frame
+def _depth(frame):
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+# one timed call of a stage or function
+class Span:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.record = {'name': name, 'rows_in': rows_in, 'rows_out': None}
+        self.sampler = None
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = list()
+        self.record['parent'] = stack[-1].name if stack else None
+        self.record['depth'] = len(stack)
+        stack.append(self)
+        if self.name == _state['profile']:
+            self.sampler = Sampler(threading.get_ident(), _state['interval'], _depth(sys._getframe(1)))
+            self.sampler.start()
+        self.rss = peak_rss()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    # rows returned by the stage, for spans opened with a with statement
+    def output(self, value):
+        self.record['rows_out'] = rows(value)
+        return value
+
+    def __exit__(self, kind, value, traceback):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        rss = peak_rss()
+        _local.stack.pop()
+        self.record.update(start=self.start, wall=wall, cpu=cpu, peak_rss=rss, rss_growth=rss - self.rss,
+                           error=None if kind is None else kind.__name__)
+        if self.sampler is not None:
+            profile = _profiles.setdefault(self.name, {'interval': self.sampler.interval, 'samples': 0,
+                                                       'stacks': Counter()})
+            stacks = self.sampler.stop()
+            profile['samples'] += sum(stacks.values())
+            profile['stacks'].update(stacks)
+        _add(self.record)
+        return False
+
+# keeps a finished span and adds it to the totals of its name
+def _add(record):
+    if len(_spans) < MAX_SPANS:
+        _spans.append(record)
+    total = _totals.setdefault(record['name'], {'calls': 0, 'wall': 0., 'cpu': 0., 'peak_rss': 0,
+                                                'rows_in': 0, 'rows_out': 0})
+    total['calls'] += 1
+    total['wall'] += record['wall']
+    total['cpu'] += record['cpu']
+    total['peak_rss'] = max(total['peak_rss'], record['peak_rss'])
+    total['rows_in'] += record['rows_in'] or 0
+    total['rows_out'] += record['rows_out'] or 0
+
+# span around a block of code, e.g. with stage('load', rows_in=n) as span: span.output(df)
+def stage(name, rows_in=None):
+    return Span(name, rows_in)
+
+# decorator that records every call of a function, the rows come from argument arg and the result
+def instrumented(name=None, arg=0):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name or func.__name__, rows(args[arg]) if len(args) > arg else None) as span:
+                return span.output(func(*args, **kwargs))
+        return wrapper
+    return decorate
+
+# writes the trace to path at exit and samples the span named profile
+def configure(path=None, profile=None, interval=INTERVAL):
+    _state.update(path=path, profile=profile, interval=interval)
+    if path is not None and not _state['registered']:
+        atexit.register(_write_at_exit)
+        _state['registered'] = True
+
+# totals per name with the shares of the wall time of the outermost spans
+def summary():
+    outer = sum(span['wall'] for span in _spans if span['depth'] == 0) or 1.
+    return {name: {**total, 'share': total['wall'] / outer} for name, total in _totals.items()}
+
+# the trace as a JSON serializable dictionary
+def trace():
+    return {
+        'meta': {'argv': sys.argv, 'pid': os.getpid(), 'python': sys.version.split()[0],
+                 'spans_dropped': max(sum(total['calls'] for total in _totals.values()) - MAX_SPANS, 0)},
+        'totals': summary(),
+        'spans': _spans,
+        'profiles': {name: {**profile, 'stacks': dict(profile['stacks'].most_common())}
+                     for name, profile in _profiles.items()},
+    }
+
+# writes the trace as JSON
+def write_trace(path=None):
+    path = path or _state['path']
+    with open(path, 'w') as f:
+        json.dump(trace(), f, indent=1)
+    return path
+
+# only the process that configured the trace writes it, pool workers leave without running atexit
+def _write_at_exit():
+    if _state['path'] is not None:
+        write_trace()
+
+# collapsed stacks of a profile, one "frame;frame;frame count" line each, the flame graph input
+def folded(profile):
+    return [f'{stack} {count}' for stack, count in profile['stacks'].items()]
+
+if TRACE_FILE is not None:
+    configure(TRACE_FILE, PROFILE_STAGE)
+
+# main function
+def main():
+    # constants
+    TOP = 20  # names in the printed summary
+
+    parser = argparse.ArgumentParser(description='Run a script of the repo and trace its stages')
+    parser.add_argument('script', help='script to run, e.g. pipeline.py')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='arguments of the script')
+    parser.add_argument('--trace', default='./trace.json', help='JSON trace file')
+    parser.add_argument('--profile', metavar='NAME', default=PROFILE_STAGE, help='span to sample with the profiler')
+    parser.add_argument('--interval', type=float, default=INTERVAL, help='seconds between profiler samples')
+    args = parser.parse_args()
+
+    sys.modules.setdefault('instrument', sys.modules[__name__])  # the scripts record into this module
+    configure(args.trace, args.profile, args.interval)
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    try:
+        with stage(os.path.basename(args.script)):
+            runpy.run_path(args.script, run_name='__main__')
+    finally:
+        write_trace()
+        totals = sorted(summary().items(), key=lambda item: -item[1]['wall'])
+        print(f'{"span":>20} {"calls":>7} {"wall":>10} {"cpu":>10} {"peak rss":>10} {"share":>7}', file=sys.stderr)
+        for name, total in totals[:TOP]:
+            print(f'{name:>20} {total["calls"]:7d} {total["wall"]:9.3f}s {total["cpu"]:9.3f}s '
+                  f'{total["peak_rss"] / 2 ** 20:8.1f}MB {total["share"]:7.1%}', file=sys.stderr)
+        for name, profile in _profiles.items():
+            path = f'{os.path.splitext(args.trace)[0]}.{name}.folded'
+            with open(path, 'w') as f:
+                f.write('\n'.join(folded(profile)) + '\n')
+            print(f'Profile of {name}: {profile["samples"]} samples in {path}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+'''
+kernels.py: Optional Numba compiled loops of the minimum spanning tree and transition code
+
+            The edge lengths, Prim's algorithm over the candidate edges, the sliding window slopes and
+            the single linkage merges are written here as plain loops that Numba compiles to machine
+            code. Without Numba (or with USE_NUMBA=0) JIT is False and emst.py, transition.py and
+            linkage.py keep their pure NumPy versions, so Numba is never required. The loops
+            repeat the arithmetic of the NumPy versions operation for operation and break ties in
+            the same way (the heap pops the smallest (cost, from, to) triple like heapq), so both
+            paths return identical arrays.
+'''
+
+# imports
+import os
+import numpy as np
+try:
+    from numba import njit
+except ImportError:  # the pure NumPy code paths are used
+    njit = None
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+JIT = njit is not None and os.environ.get('USE_NUMBA', '1') != '0'
+
+# compiles a loop when Numba is used, the loops still run (slowly) as Python otherwise
+def _jit(func):
+    return njit(cache=True, nogil=True)(func) if JIT else func
+
+# length of every edge (lo[k], hi[k]) between points in the plane
+@_jit
+def edge_lengths(x, y, lo, hi):
+    weight = np.empty(len(lo))
+    for k in range(len(lo)):
+        weight[k] = np.hypot(x[lo[k]] - x[hi[k]], y[lo[k]] - y[hi[k]])
+    return weight
+
+# true when the triple (c1, u1, v1) orders before (c2, u2, v2)
+@_jit
+def _before(c1, u1, v1, c2, u2, v2):
+    if c1 != c2:
+        return c1 < c2
+    if u1 != u2:
+        return u1 < u2
+    return v1 < v2
+
+# adds an edge to a binary heap stored in three arrays and returns the new heap size
+@_jit
+def _push(cost, frm, to, size, c, u, v):
+    k = size
+    while k > 0:
+        up = (k - 1) // 2
+        if not _before(c, u, v, cost[up], frm[up], to[up]):
+            break
+        cost[k], frm[k], to[k] = cost[up], frm[up], to[up]
+        k = up
+    cost[k], frm[k], to[k] = c, u, v
+    return size + 1
+
+# removes the smallest edge of a binary heap (read it from position 0 first) and returns the new size
+@_jit
+def _pop(cost, frm, to, size):
+    size -= 1
+    c, u, v = cost[size], frm[size], to[size]
+    k = 0
+    while True:
+        child = 2 * k + 1
+        if child >= size:
+            break
+        if child + 1 < size and _before(cost[child + 1], frm[child + 1], to[child + 1],
+                                        cost[child], frm[child], to[child]):
+            child += 1
+        if not _before(cost[child], frm[child], to[child], c, u, v):
+            break
+        cost[k], frm[k], to[k] = cost[child], frm[child], to[child]
+        k = child
+    cost[k], frm[k], to[k] = c, u, v
+    return size
+
+# Prim's algorithm with a heap over compressed adjacency lists, the counterpart of emst.prim
+@_jit
+def heap_prim(indptr, dst, wts, start):
+    n = len(indptr) - 1
+    visited = np.zeros(n, dtype=np.bool_)
+    parent = np.full(n, -1, dtype=np.intp)
+    order = np.empty(n, dtype=np.intp)
+    cost = np.empty(n)
+    heap_cost = np.empty(len(dst) + 1)  # every directed edge is pushed at most once
+    heap_frm = np.empty(len(dst) + 1, dtype=np.intp)
+    heap_to = np.empty(len(dst) + 1, dtype=np.intp)
+
+    visited[start] = True
+    order[0] = start
+    cost[0] = 0.
+    count = 1
+    size = 0
+    for k in range(indptr[start], indptr[start + 1]):
+        size = _push(heap_cost, heap_frm, heap_to, size, wts[k], start, dst[k])
+    while size > 0:
+        c, u, v = heap_cost[0], heap_frm[0], heap_to[0]
+        size = _pop(heap_cost, heap_frm, heap_to, size)
+        if not visited[v]:
+            visited[v] = True
+            order[count] = v
+            parent[v] = u
+            cost[count] = c
+            count += 1
+            for k in range(indptr[v], indptr[v + 1]):
+                if not visited[dst[k]]:
+                    size = _push(heap_cost, heap_frm, heap_to, size, wts[k], v, dst[k])
+    return (order[:count], parent, cost[:count])
+
+# least squares slopes of the windows [start, stop) from prefix sums, the counterpart of transition.window_slopes
+@_jit
+def window_slopes(sx, sy, sxx, sxy, start, stop):
+    slope = np.zeros(len(start))
+    for k in range(len(start)):
+        a = start[k]
+        b = stop[k]
+        m = b - a
+        x = sx[b] - sx[a]
+        y = sy[b] - sy[a]
+        den = m * (sxx[b] - sxx[a]) - x * x
+        if den != 0:
+            slope[k] = (m * (sxy[b] - sxy[a]) - x * y) / den
+    return slope
+
+# root of a point in a union-find forest, halving the path on the way
+@_jit
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+# union-find merges of the edges in order, the counterpart of linkage.single_linkage
+@_jit
+def single_linkage(n, frm, to, start):
+    m = len(frm)
+    parent = np.arange(n)
+    node = np.arange(n)  # dendrogram node of every root, leaves are 0..n-1 and merge k is n + k
+    size = np.ones(n, dtype=np.intp)
+    head = np.arange(n)  # every component is a linked list of its leaves
+    tail = np.arange(n)
+    nxt = np.full(n, -1, dtype=np.intp)
+    left = np.empty(m, dtype=np.intp)
+    right = np.empty(m, dtype=np.intp)
+    merged = np.empty(m, dtype=np.intp)
+    first = np.empty(m, dtype=np.intp)
+    grows = np.zeros(m, dtype=np.bool_)  # merges that grow the component of the start
+    root = start
+
+    for k in range(m):
+        a = _find(parent, frm[k])
+        b = _find(parent, to[k])
+        left[k] = node[a]
+        right[k] = node[b]
+        grows[k] = a == root or b == root
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        nxt[tail[a]] = head[b]  # the leaves of b follow those of a, so every node stays contiguous
+        tail[a] = tail[b]
+        size[a] += size[b]
+        node[a] = n + k
+        merged[k] = size[a]
+        first[k] = head[a]
+        if grows[k]:
+            root = a
+
+    # leaf order of every component one after the other
+    leaves = np.empty(n, dtype=np.intp)
+    count = 0
+    for i in range(n):
+        if parent[i] == i:
+            j = head[i]
+            while j != -1:
+                leaves[count] = j
+                count += 1
+                j = nxt[j]
+    return (left, right, merged, first, leaves, grows)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+'''
+linkage.py: Single linkage hierarchy of the Vector Point Diagram (VPD) from its minimum spanning tree
+
+            The single linkage clusters at a distance threshold d are the components of the minimum
+            spanning tree (MST) without its edges longer than d, so merging the MST edges in order of
+            length with a union-find gives the whole dendrogram in O(N log N) without any other graph
+            work. The leaves are kept in an order where every dendrogram node is a contiguous run,
+            and the merges that grow the component of the starting star are listed with their
+            lengths and sizes. The component of the starting star at any threshold or for any member
+            count is then one binary search (O(log N)) and a slice of the leaf order, so membership
+            sweeps and threshold tuning never rebuild the tree.
+
+            Without Numba the union-find loop is replaced by array operations: the points joined by
+            the edges ranked below any edge are runs of Prim's visit order of the tree ranked by merge
+            order (emst.tree_order), so the two nodes of every merge are found from the nearest higher
+            ranked edges on either side of it, and the leaf order is laid out by pointer jumping.
+'''
+
+# imports
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import breadth_first_order, connected_components
+from emst import tree_order
+import kernels
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# nearest position before and after every position of a sequence with a larger value (-1 and len(values) when none)
+# binary lifting over a table of the maxima of the runs of 2^p values
+def _nearest_higher(values):
+    n = len(values)
+    runs = [values]
+    while 1 << len(runs) <= n:
+        step = 1 << (len(runs) - 1)
+        runs.append(np.maximum(runs[-1][:-step], runs[-1][step:]))
+    before = np.arange(n)
+    after = np.arange(1, n + 1)
+    for p in reversed(range(len(runs))):
+        step = 1 << p
+        skip = (before >= step) & (runs[p][np.maximum(before - step, 0)] < values)
+        before[skip] -= step
+        skip = (after + step <= n) & (runs[p][np.minimum(after, len(runs[p]) - 1)] < values)
+        after[skip] += step
+    return (before - 1, after)
+
+# merges the components joined by edges sorted by weight: merged nodes, sizes, first leaves, leaf order and start merges
+# the same arrays as kernels.single_linkage, read off the merge ranks in the order Prim's algorithm visits the points
+def single_linkage(n, frm, to, start):
+    if kernels.JIT:
+        return kernels.single_linkage(n, frm, to, start)
+    frm = np.asarray(frm, dtype=np.intp)
+    to = np.asarray(to, dtype=np.intp)
+    m = len(frm)
+
+    # an extra point n joins the first point of every tree of the forest through edges ranked after all others
+    _, tree = connected_components(coo_matrix((np.ones(m), (frm, to)), shape=(n, n)), directed=False)
+    lo = np.concatenate([frm, np.full(tree.max(initial=-1) + 1, n)])
+    hi = np.concatenate([to, np.unique(tree, return_index=True)[1]])
+    graph = coo_matrix((np.ones(len(lo)), (lo, hi)), shape=(n + 1, n + 1))
+    _, parent = breadth_first_order(graph, n, directed=False, return_predecessors=True)
+    parent[n] = -1
+    rank = np.empty(n + 1, dtype=np.intp)
+    rank[np.where(parent[hi] == lo, hi, lo)] = np.arange(len(lo))  # rank of the edge to the parent of every point
+    rank[n] = len(lo)
+
+    # the points joined by the edges ranked below k are runs of Prim's visit order, so every merge joins the run
+    # since the last higher ranked edge to the run up to the next one
+    order = tree_order(parent, rank, n)
+    ranks = rank[order]
+    before, after = _nearest_higher(ranks)
+    bounded = np.append(ranks, len(lo))  # the end of the visit order ranks above every edge
+    position = np.empty(n + 1, dtype=np.intp)
+    position[order] = np.arange(n + 1)
+
+    # every edge and point hangs below the lower of the higher ranked edges next to it, the top of the run before
+    # an edge hangs from its left and the top of the run after it from its right
+    run_before = np.zeros(n + 2, dtype=np.intp)
+    run_after = np.zeros(n + 2, dtype=np.intp)
+    edges = np.flatnonzero(ranks < m)
+    later = bounded[after[edges]] < ranks[before[edges]]
+    run_before[after[edges[later]]] = n + ranks[edges[later]]
+    run_after[before[edges[~later]]] = n + ranks[edges[~later]]
+    points = np.arange(1, n + 1)
+    later = bounded[points + 1] < ranks[points]
+    run_before[points[later] + 1] = order[points[later]]
+    run_after[points[~later]] = order[points[~later]]
+
+    # the end of every edge that Prim's algorithm visits first is in the run before it
+    k = np.arange(m)
+    ahead = parent[to] == frm
+    at = np.where(ahead, position[to], position[frm])
+    left = np.where(ahead, run_before[at], run_after[at])
+    right = np.where(ahead, run_after[at], run_before[at])
+    size_left = np.where(ahead, at - before[at], after[at] - at)
+    size_right = np.where(ahead, after[at] - at, at - before[at])
+
+    # dendrogram parents, the larger component of every merge comes first in the leaf order
+    merged = size_left + size_right
+    swap = size_left < size_right
+    first_child = np.where(swap, right, left)
+    second_child = np.where(swap, left, right)
+    up = np.arange(n + m)
+    up[first_child] = n + k
+    up[second_child] = n + k
+    weight = np.concatenate([np.ones(n, dtype=np.intp), merged])
+    offset = np.zeros(n + m, dtype=np.intp)
+    offset[second_child] = weight[first_child]
+
+    # offset of every node in the leaf run of its root, summed over its ancestors by pointer jumping
+    while not np.array_equal(up, up[up]):
+        offset = offset + offset[up]  # the offset of a root is 0
+        up = up[up]
+
+    # the runs of the roots follow each other in order of their first leaf
+    heads = np.flatnonzero(offset[:n] == 0)
+    run = np.zeros(n + m, dtype=np.intp)
+    run[up[heads]] = np.cumsum(weight[up[heads]]) - weight[up[heads]]
+    place = run[up] + offset
+    leaves = np.empty(n, dtype=np.intp)
+    leaves[place[:n]] = np.arange(n)
+    first = leaves[place[n:]]
+    grows = (place[n:] <= place[start]) & (place[start] < place[n:] + merged)
+    return (left, right, merged, first, leaves, grows)
+
+# single linkage dendrogram of n points from the edges of their minimum spanning tree (or forest)
+class SingleLinkage:
+    def __init__(self, n, frm, to, weight, start):
+        weight = np.asarray(weight, dtype=float)
+        by_weight = np.argsort(weight, kind='stable')
+        frm = np.asarray(frm, dtype=np.intp)[by_weight]
+        to = np.asarray(to, dtype=np.intp)[by_weight]
+        left, right, size, first, leaves, grows = single_linkage(n, frm, to, start)
+
+        self.n = n
+        self.start = start
+        self.left = left  # merge k joins the nodes left[k] and right[k] into node n + k
+        self.right = right
+        self.height = weight[by_weight]  # length of the edge of every merge, ascending
+        self.size = size  # points below every merge
+        self.leaves = leaves  # every node is the run leaves[offset:offset + size]
+        position = np.empty(n, dtype=np.intp)
+        position[leaves] = np.arange(n)
+        self.offset = position[first]  # start of every merge in the leaf order
+
+        # merges that grow the component of the starting star, with lengths and sizes ascending
+        self.chain = np.flatnonzero(grows)
+        self.chain_height = self.height[self.chain]
+        self.chain_size = self.size[self.chain]
+        self.start_offset = position[start]
+
+    # leaves of the component of the starting star after the first k of its merges
+    def _component(self, k):
+        if k == 0:
+            return self.leaves[self.start_offset:self.start_offset + 1]
+        merge = self.chain[k - 1]
+        return self.leaves[self.offset[merge]:self.offset[merge] + self.size[merge]]
+
+    # positions in the component of the starting star when the edges up to threshold are kept
+    def at_threshold(self, threshold):
+        return self._component(int(np.searchsorted(self.chain_height, threshold, side='right')))
+
+    # positions in the smallest component of the starting star with at least count members (or the largest one)
+    def at_count(self, count):
+        if count <= 1:
+            return self._component(0)
+        return self._component(min(int(np.searchsorted(self.chain_size, count, side='left')) + 1, len(self.chain)))
+
+    # smallest threshold at which the component of the starting star has at least count members
+    def threshold_for(self, count):
+        if count <= 1:
+            return 0.
+        k = int(np.searchsorted(self.chain_size, count, side='left'))
+        return self.chain_height[k] if k < len(self.chain) else np.inf
+
+    # size of the component of the starting star at every threshold
+    def component_size(self, thresholds):
+        k = np.searchsorted(self.chain_height, thresholds, side='right')
+        return np.concatenate([[1], self.chain_size])[k]
+
+    # dendrogram in the (left, right, height, size) layout of scipy.cluster.hierarchy.linkage
+    def linkage_matrix(self):
+        return np.column_stack([self.left, self.right, self.height, self.size]).astype(float)
+
+# single linkage hierarchy of the points of a SpanningTree, rooted at the start of the tree
+def from_tree(tree):
+    frm, to, weight = tree.edges()
+    return SingleLinkage(len(tree.parent), frm, to, weight, tree.start)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+'''
+membership.py: Row selections passed between the data reduction stages
+
+               A stage selects its members as a boolean mask or as integer row positions of its
+               input table, and the selected rows are taken in one vectorized step. The taken rows
+               keep the index of their input, so a stage result always carries the row positions
+               of the table the chain started from and later stages can select from it by position
+               without matching values such as pmra or source_id.
+'''
+
+# imports
+import numpy as np
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# row positions of a selection given as a boolean mask or as row positions
+def as_rows(selection):
+    selection = np.asarray(selection)
+    if selection.dtype == bool:
+        return np.flatnonzero(selection)
+    return selection.astype(np.intp, copy=False)
+
+# selected rows of a table in one take, the index of the table is kept
+def take(df, selection):
+    return df.iloc[as_rows(selection)]
+
+# row positions of the members of a stage result in the table the chain started from
+def member_rows(df):
+    return np.asarray(df.index, dtype=np.intp)
+
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+'''
+montecarlo.py: Propagates the astrometric errors through the MST membership and the covering radius
+
+               Realizations of the Vector Point Diagram (VPD) are drawn from the proper motion error
+               covariance of every star (pmra_error, pmdec_error and pmra_pmdec_corr), a whole batch
+               of realizations at a time. Each one goes through the MST membership and the covering
+               radius selection, both O(N log N) per realization, and the batches are spread across a
+               process pool. Every batch has its own child of one SeedSequence, so the results do not
+               depend on the number of processes. The output is the probability of every star to be
+               an MST member and a final member, and the distribution of the covering radius. The
+               spanning trees of every realization start at the star picked from the unperturbed VPD.
+'''
+
+# imports
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from multiprocessing import Pool
+from columnar import load_table
+from membership import member_rows
+from mst import densest_star, select_members
+from radius import MAX_RAD, covering_radius
+import figures
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+REALIZATIONS = 200
+BATCH = 10  # realizations drawn and processed per task
+SEED = 2021
+COLUMNS = ['source_id', 'ra', 'dec', 'pmra', 'pmdec', 'pmra_error', 'pmdec_error', 'pmra_pmdec_corr']
+_shared = dict()  # table and parameters of each worker
+
+# draws size realizations of every star's (pmra, pmdec) from its error covariance, shape (size, n, 2)
+def draw_vpd(df, size, rng):
+    sa = np.asarray(df['pmra_error'], dtype=float)
+    sd = np.asarray(df['pmdec_error'], dtype=float)
+    rho = np.clip(np.asarray(df['pmra_pmdec_corr'], dtype=float), -1, 1)
+    z = rng.standard_normal((size, len(df), 2))
+
+    # cholesky factor of [[sa^2, rho sa sd], [rho sa sd, sd^2]] applied to standard normals
+    dpmra = sa * z[..., 0]
+    dpmdec = sd * (rho * z[..., 0] + np.sqrt(1 - rho ** 2) * z[..., 1])
+    center = np.column_stack([np.asarray(df['pmra'], dtype=float), np.asarray(df['pmdec'], dtype=float)])
+    return center + np.stack([dpmra, dpmdec], axis=-1)
+
+# MST member rows, final member rows and covering radius of one VPD realization
+def realization(df, vpd, start_id, max_rad=MAX_RAD):
+    members = select_members(df.assign(pmra=vpd[:, 0], pmdec=vpd[:, 1]), start_id)
+    _, rows, rad = covering_radius(members, max_rad, processes=1)
+    return (member_rows(members), member_rows(members)[rows], rad)
+
+# membership counts and covering radii of one batch of realizations
+def run_batch(df, seed, size, start_id, max_rad=MAX_RAD):
+    mst_counts = np.zeros(len(df), dtype=np.int64)
+    final_counts = np.zeros(len(df), dtype=np.int64)
+    radii = np.empty(size)
+    for k, vpd in enumerate(draw_vpd(df, size, np.random.default_rng(seed))):
+        mst_rows, final_rows, radii[k] = realization(df, vpd, start_id, max_rad)
+        mst_counts[mst_rows] += 1
+        final_counts[final_rows] += 1
+    return (mst_counts, final_counts, radii)
+
+# membership probabilities of every star and the covering radius of every realization
+def propagate(df, realizations=REALIZATIONS, batch=BATCH, seed=SEED, start_id=None, max_rad=MAX_RAD,
+              processes=None):
+    df = df.reset_index(drop=True)  # member rows are positions in df
+    if start_id is None:
+        start_id = densest_star(df)
+    sizes = [min(batch, realizations - start) for start in range(0, realizations, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(child, size) for child, size in zip(seeds, sizes)]
+    with Pool(processes, initializer=_attach, initargs=(df, start_id, max_rad)) as pool:
+        results = pool.map(_run, tasks, chunksize=1)
+
+    probs = pd.DataFrame({
+        'source_id': df['source_id'],
+        'p_mst': sum(result[0] for result in results) / realizations,
+        'p_member': sum(result[1] for result in results) / realizations,
+    })
+    return (probs, np.concatenate([result[2] for result in results]))
+
+# keeps the table and parameters in a worker process
+def _attach(df, start_id, max_rad):
+    _shared['df'] = df
+    _shared['start_id'] = start_id
+    _shared['max_rad'] = max_rad
+
+def _run(task):
+    seed, size = task
+    return run_batch(_shared['df'], seed, size, _shared['start_id'], _shared['max_rad'])
+
+# main function
+def main():
+    # constants
+    FILENAME = r'./csv/stat_adj.csv'
+    OUTPUT = r'./csv/membership_mc.csv'
+
+    parser = argparse.ArgumentParser(description='Monte Carlo propagation of the proper motion errors')
+    parser.add_argument('--realizations', type=int, default=REALIZATIONS, help='number of VPD realizations')
+    parser.add_argument('--batch', type=int, default=BATCH, help='realizations per task')
+    parser.add_argument('--seed', type=int, default=SEED, help='seed of the SeedSequence')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (every core by default)')
+    args = parser.parse_args()
+
+    df = load_table(FILENAME, COLUMNS)
+    probs, radii = propagate(df, args.realizations, args.batch, args.seed, processes=args.processes)
+    probs.to_csv(OUTPUT, index=False)
+
+    lo, med, hi = np.percentile(radii, [16, 50, 84])
+    print(f'Covering Radius: {med:.1f} (+{hi - med:.1f} / -{med - lo:.1f}) arcmin')
+    print(f'Expected members: {probs["p_member"].sum():.1f}')
+
+    # plotting
+    plt.hist(radii, bins=np.arange(0, MAX_RAD + 0.4, 0.2), histtype='step', label='Realizations')
+    plt.axvline(med, color='k', linestyle='-.', label='Median')
+    plt.xlabel(r'$R_s$' + ' (arcmin)')
+    plt.ylabel('Count')
+    plt.legend(loc='best')
+    plt.title('Covering Radius Distribution')
+    figures.show('montecarlo_radius')
+
+if __name__ == '__main__':
+    main()
@@ -11,13 +11,17 @@ mst.py: Takes a CSV file and computes the minimum spanning tree with the Vector
 '''
 
 # imports
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import heapq as hq
-from collections import defaultdict
-from math import sqrt, atan, pi
-from sklearn.linear_model import LinearRegression
+from scipy.stats import gaussian_kde
+from kde import point_density
+from transition import NMIN_FACTOR
+import core
+from columnar import load_table, save_rows
+from membership import take
+from linkage import from_tree
+from instrument import instrumented
+import figures
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -30,110 +34,62 @@ __status__ = 'Production'
 
 # globals
 NT = r'$N_t$'
-
-# assigns weight to each element in order to make a weighted graph data structure
-def graph_weight(dataframe):
-    graph = dict()
-    pmra = np.array(dataframe['pmra'])
-    pmdec = np.array(dataframe['pmdec'])
-    ids = np.array(dataframe['source_id'])
-
-    for i in range(len(dataframe)):
-        for j in range(i + 1, len(dataframe)):
-            # compute distance between two data points to store as edge weight
-            deltax = abs(pmra[i] - pmra[j])
-            deltay = abs(pmdec[i] - pmdec[j])
-            weight = sqrt(deltax ** 2. + deltay ** 2.)
-            if ids[i] not in graph:
-                graph.setdefault(ids[i], {})
-            graph.get(ids[i]).setdefault(ids[j], weight)
-            if ids[j] not in graph:
-                graph.setdefault(ids[j], {})
-            graph.get(ids[j]).setdefault(ids[i], weight)
-    return graph
-
-# simulates minimum spanning tree from a weighted graph and a starting vertex and displays average edge length
-def spanning_tree(graph, starting_vertex, display, mins=0):
-    visited = set([starting_vertex])  # assigns starting_vertex as visited
-    edges = [(cost, starting_vertex, to) for to, cost in graph[starting_vertex].items()]
-    hq.heapify(edges)  # uses heap queue for MST
-
-    # initializing loop parameters
-    count = curr_cost = 0
-    avglen = [0]
-    mems = [starting_vertex]
-
-    # graph loop for Prim's Algorithm
-    while edges:
-        cost, frm, to = hq.heappop(edges)
-        # check for previously visited vertices to prevent cycles
-        if to not in visited:
-            if count < mins:
-                mems.append(to)
-            curr_cost += cost
-            count += 1
-            avglen.append(curr_cost / count)  # computes average length of the MST per iteration
-            visited.add(to)
-            for to_next, cost in graph[to].items():
-                if to_next not in visited:
-                    hq.heappush(edges, (cost, to, to_next))
-    
-    x = np.linspace(0, len(graph) - 1, len(graph))  # x values for plotting
-    
-    # display graph if requested
-    if(display):
-        plt.plot(x, avglen, 'r--', label='Average length of MST edges per Iteration')
-        plt.xlabel(NT)
-        plt.ylabel(r'$L_t$')
-        plt.legend(loc='best')
-        plt.title('Average Length of Edges of Spanning Tree per Iteration')
-        plt.show()
-
-    normx = list(map(lambda c: c / max(x), x))  # x values normalized for plotting
-    normlen = list(map(lambda c: c / max(avglen), avglen))   # y values normalized for plotting
-    return (normx, normlen, mems)
-
-# determines the inclination angles of left-sided and right-sided lines of best fit to locate transition points
-def inclination_angle(nmin, xvals, yvals):
-    vals = list()
-    cangle = list()
-    fangle = list()
-    model = LinearRegression()
-
-    # span all possible points where Nmin < Nt < Ndat - Nmin
-    for i in range(nmin, len(xvals) - nmin):
-        # obtain all points for linear regression
-        xleft = np.array(xvals[i - nmin:i + 1]).reshape(-1, 1)
-        yleft = np.array(yvals[i - nmin:i + 1])
-        xright = np.array(xvals[i:i + nmin + 1]).reshape(-1, 1)
-        yright = np.array(yvals[i:i + nmin + 1])
-        vals.append(i)
-
-        # linear regression to find slope and compute angle of inclination
-        model.fit(xleft, yleft)
-        cangle.append(atan(model.coef_[0]) * 180 / pi)  # cluster angle
-        model.fit(xright, yright)
-        fangle.append(atan(model.coef_[0]) * 180 / pi)  # field angle
-    
-    return (vals, cangle, fangle)
+START_ID = None  # source_id of the starting vertex, None picks the densest point in the VPD
+COLUMNS = ['source_id', 'pmra', 'pmdec', 'bp_rp', 'phot_g_mean_mag']  # columns used by the MST selection
+NMIN_FACTORS = np.linspace(1, 6, 21)  # Nmin / sqrt(Ndat) values of the sensitivity scan
+DENSEST_CANDIDATES = 32  # stars of highest binned density that the exact KDE decides between
+
+# plots the average length of the MST edges against the number of iterations
+def plot_average_length(avglen):
+    x = np.linspace(0, len(avglen) - 1, len(avglen))  # x values for plotting
+    plt.plot(x, avglen, 'r--', label='Average length of MST edges per Iteration')
+    plt.xlabel(NT)
+    plt.ylabel(r'$L_t$')
+    plt.legend(loc='best')
+    plt.title('Average Length of Edges of Spanning Tree per Iteration')
+    figures.show('mst_average_length')
+
+# source_id of the data point at the highest density of the VPD
+# the binned KDE ranks the stars and the exact KDE is only evaluated at the top candidates
+@instrumented('densest_star')
+def densest_star(df, candidates=DENSEST_CANDIDATES):
+    xy = np.vstack([np.array(df['pmra'], dtype=float), np.array(df['pmdec'], dtype=float)])
+    top = np.argsort(point_density(xy), kind='stable')[::-1][:candidates]
+    z = gaussian_kde(xy)(xy[:, top])
+    return df['source_id'].iloc[top[np.argmax(z)]]
+
+# keeps the stars that Prim's algorithm visits before the transition point
+@instrumented('select_members')
+def select_members(df, start_id=START_ID):
+    if start_id is None:
+        start_id = densest_star(df)
+    start = int(np.flatnonzero(df['source_id'] == start_id)[0])
+    tree = core.spanning_tree(df['pmra'], df['pmdec'], start)
+    xmax, _ = core.transition_point(tree.avglen)
+    return take(df, np.sort(tree.members(xmax)))
 
 # main function
 def main():
     # constants
     FILENAME = './csv/stat_adj.csv'
+    TREE_FILE = './csv/vpd_tree.npz'
 
     # dataframe
-    df = pd.read_csv(FILENAME)
-
-    # mst generation
-    START_ID = 2013610376379103104  # source_id of data point closest to mean PMRA and mean PMDEC
-    gr = graph_weight(df)  # get weighted graph
-    normx, normlen, _ = spanning_tree(gr, START_ID, True)
-
-    # Nmin
-    ndat = len(normx)
-    nmin = round(3 * sqrt(ndat))
-    xvals, cluster, field = inclination_angle(nmin, normx, normlen)
+    df = load_table(FILENAME, COLUMNS)
+
+    # mst generation, the stored tree is reused when it was built from the same VPD and starting vertex
+    start_id = START_ID if START_ID is not None else densest_star(df)
+    start = int(np.flatnonzero(df['source_id'] == start_id)[0])
+    key = core.tree_key(df['pmra'], df['pmdec'], start)
+    tree = core.load_tree(TREE_FILE, key)
+    if tree is None:
+        tree = core.spanning_tree(df['pmra'], df['pmdec'], start)
+        tree.key = key
+        tree.save(TREE_FILE)
+    plot_average_length(tree.avglen)
+
+    # inclination angles and transition parameter along the average length curve
+    xvals, cluster, field, transition = core.transition_curve(tree.avglen)
 
     # Inclination Plot
     plt.plot(xvals, cluster, 'b-', label=r'Cluster Angle ($\alpha_c$)')
@@ -143,19 +99,10 @@ def main():
     plt.ylabel(r'$\alpha$ (deg)')
     plt.legend(loc='best')
     plt.title('Inclination Angle of Cluster and Field data per Iteration')
-    plt.show()
+    figures.show('mst_inclination')
 
-    # Dimensionless Transition Parameter
-    ALPHA_MAX = 90
-    DELTA = 0.01 * ALPHA_MAX
-    transition = list()
-
-    # calculate transition parameter at each point
-    for i in range(len(cluster)):
-        diff = field[i] - cluster[i]
-        transition.append((diff / max(cluster[i], DELTA)) * (DELTA / ALPHA_MAX))
-
-    index = transition.index(max(transition))
+    # Dimensionless Transition Parameter at each point
+    index = np.argmax(transition)
     xmax = xvals[index]
 
     # plotting
@@ -166,26 +113,43 @@ def main():
     plt.ylabel(r'$\eta$')
     plt.legend(loc='best')
     plt.title('Transition Paramater Graph')
-    plt.show()
-
-    _, _, mems = spanning_tree(gr, START_ID, False, xmax)
-    data = pd.read_csv(FILENAME, index_col='source_id')
-    bprp = list()
-    g = list()
-    for elem in mems:
-        bprp.append(data.loc[elem]['bp_rp'])
-        g.append(data.loc[elem]['phot_g_mean_mag'])
-
-    plt.plot(df['bp_rp'], df['phot_g_mean_mag'], 'b.', label='Original Data')
-    plt.plot(bprp, g, 'r.', label='MST Data')
+    figures.show('mst_transition')
+
+    # sensitivity of the transition point to Nmin
+    nmins, points, peaks = core.nmin_scan(tree.avglen, NMIN_FACTORS)
+    for factor, scale, point, peak in zip(NMIN_FACTORS, nmins, points, peaks):
+        print(f'Nmin = {factor:.2f} sqrt(Ndat) = {scale}: transition point {point} (eta {peak:.4f})')
+    plt.plot(NMIN_FACTORS, points, 'r.-', label='Transition Point')
+    plt.axvline(NMIN_FACTOR, color='k', linestyle='-.', label=r'$N_{min} = 3\sqrt{N_{dat}}$')
+    plt.xlabel(r'$N_{min} / \sqrt{N_{dat}}$')
+    plt.ylabel(NT)
+    plt.legend(loc='best')
+    plt.title('Transition Point per Window Size')
+    figures.show('mst_nmin_scan')
+
+    rows = np.sort(tree.members(xmax))  # starting vertex and the first xmax vertices visited
+    members = take(df, rows)
+
+    # single linkage component of the starting vertex per distance threshold, from the same tree
+    hierarchy = from_tree(tree)
+    print(f'Single linkage threshold for {len(rows)} members: {hierarchy.threshold_for(len(rows)):.4f} mas/yr')
+    plt.step(hierarchy.chain_height, hierarchy.chain_size, 'r-', where='post', label='Component of the Starting Vertex')
+    plt.axhline(len(rows), color='b', linestyle='--', label='MST Members')
+    plt.xlabel('Threshold (mas/yr)')
+    plt.ylabel('Members')
+    plt.legend(loc='best')
+    plt.title('Single Linkage Membership per Distance Threshold')
+    figures.show('mst_single_linkage')
+
+    figures.plot_points(df['bp_rp'], df['phot_g_mean_mag'], 'b.', label='Original Data')
+    figures.plot_points(members['bp_rp'], members['phot_g_mean_mag'], 'r.', label='MST Data')
     plt.xlabel(r'$B_P-R_P$' + ' (mag)')
     plt.gca().invert_yaxis()
     plt.ylabel(r'$G$' + ' (mag)')
     plt.legend(loc='best')
-    plt.show()
+    figures.show('mst_cmd')
 
-    df2 = df[df['source_id'].isin(mems)]
-    df2.to_csv('./csv/vpd_adj.csv', index=False)
+    save_rows(FILENAME, rows, './csv/vpd_adj.csv')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+'''
+pipeline.py: Runs the data reduction stages as a graph and passes the dataframes between them in memory
+
+             Each stage (error removal, DBSCAN, sigma clipping, MST membership and covering radius) is a
+             function of the results of its input stages and of a few named parameters. The result of
+             every stage is cached as a typed columnar table under a hash of the stage code, its
+             parameters and the hashes of its inputs, so a rerun only recomputes the stages downstream
+             of a changed parameter or input file. The stage code is the source of the module of the
+             stage function and of every module of the repo it imports, directly or through other
+             modules, so editing a helper also invalidates the stage. Installed libraries and files a
+             stage reads by itself are not part of the hash: after upgrading a library the cache has
+             to be skipped (--no-cache) or the version of the stage raised. Only the final membership
+             table is written out as a CSV.
+'''
+
+# imports
+import argparse
+import ast
+import functools
+import hashlib
+import inspect
+import os
+import pandas as pd
+import clean
+import db
+import data_reductions
+import mst
+import radius
+from columnar import is_columnar, load_table, read_table, write_table
+import instrument
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+CACHE_DIR = r'./cache'
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))  # modules here are part of the stage code
+PARAMS = {
+    'ERROR_THRESHOLD': clean.ERROR_THRESHOLD,
+    'SAMPLE_SIZE': db.SAMPLE_SIZE,
+    'START_ID': mst.START_ID,
+    'MAX_RAD': radius.MAX_RAD,
+    'PROCESSES': radius.PROCESSES,
+}
+
+# source files of the repo that a source file imports, read from its import statements
+def local_imports(path):
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.add(node.module)
+    paths = (os.path.join(REPO_DIR, f'{name.split(".")[0]}.py') for name in names)
+    return {path for path in paths if os.path.isfile(path)}
+
+# hash of a source file and of every source file of the repo it imports, recursively
+@functools.lru_cache(maxsize=None)
+def code_key(path):
+    paths = {path}
+    pending = [path]
+    while pending:
+        for dep in local_imports(pending.pop()) - paths:
+            paths.add(dep)
+            pending.append(dep)
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        h.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# a pipeline step computed from the results of its inputs and a set of named parameters
+class Stage:
+    def __init__(self, name, func, inputs, params=None, version=0):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.params = params or dict()  # function keyword -> pipeline parameter name
+        self.version = version  # raised to invalidate the cache for changes the code hash cannot see
+
+    # hash of the stage code, its version, its parameter values and the hashes of its inputs
+    def key(self, params, input_keys):
+        h = hashlib.sha256()
+        h.update(f'{self.name}:{self.version}'.encode())
+        h.update(code_key(os.path.abspath(inspect.getsourcefile(inspect.unwrap(self.func)))).encode())
+        for kw, name in sorted(self.params.items()):
+            h.update(f'{kw}={params[name]!r}'.encode())
+        for key in input_keys:
+            h.update(key.encode())
+        return h.hexdigest()
+
+    # runs the stage on the input dataframes and records it in the trace
+    def run(self, frames, params):
+        kwargs = {kw: params[name] for kw, name in self.params.items()}
+        with instrument.stage(self.name, instrument.rows(frames[0]) if frames else None) as span:
+            return span.output(self.func(*frames, **kwargs))
+
+STAGES = [
+    Stage('err_rm', clean.clean, ['raw'], {'threshold': 'ERROR_THRESHOLD'}),
+    Stage('reduced', db.select_cluster, ['err_rm'], {'sample_size': 'SAMPLE_SIZE'}),
+    Stage('stat_adj', data_reductions.sigma_clip, ['reduced']),
+    Stage('vpd_adj', mst.select_members, ['stat_adj'], {'start_id': 'START_ID'}),
+    Stage('final', radius.select_radius, ['vpd_adj'], {'max_rad': 'MAX_RAD', 'processes': 'PROCESSES'}),
+]
+
+# content hash of a source, either a file path or a dataframe
+def source_key(source):
+    h = hashlib.sha256()
+    if isinstance(source, pd.DataFrame):
+        h.update(pd.util.hash_pandas_object(source).values.tobytes())
+        h.update(','.join(map(str, source.columns)).encode())
+    else:
+        paths = [source]
+        if is_columnar(source):
+            paths = [os.path.join(source, name) for name in sorted(os.listdir(source))]
+        for path in paths:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+    return h.hexdigest()
+
+# directed acyclic graph of stages with content-hash caching of every stage result
+class Pipeline:
+    def __init__(self, stages=STAGES, cache_dir=CACHE_DIR):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+
+    # stage names in dependency order
+    def order(self, targets=None):
+        seen = list()
+        def visit(name):
+            if name in self.stages and name not in seen:
+                for dep in self.stages[name].inputs:
+                    visit(dep)
+                seen.append(name)
+        for name in targets or self.stages:
+            visit(name)
+        return seen
+
+    # cache keys of every stage, they only depend on the keys upstream so no data is loaded
+    def keys(self, sources, params):
+        keys = {name: source_key(source) for name, source in sources.items()}
+        for name in self.order():
+            stage = self.stages[name]
+            keys[name] = stage.key(params, [keys[dep] for dep in stage.inputs])
+        return keys
+
+    # results of the target stages, reusing every cached stage whose key is unchanged
+    def run(self, sources, params=None, targets=None, use_cache=True):
+        params = {**PARAMS, **(params or dict())}
+        keys = self.keys(sources, params)
+        results = dict()
+
+        def result(name):
+            if name in results:
+                return results[name]
+            if name not in self.stages:
+                source = sources[name]
+                frame = source if isinstance(source, pd.DataFrame) else load_table(source)
+            else:
+                path = os.path.join(self.cache_dir, f'{name}-{keys[name][:16]}')
+                if use_cache and is_columnar(path):
+                    with instrument.stage('cache_load') as span:
+                        frame = span.output(read_table(path))
+                else:
+                    stage = self.stages[name]
+                    frame = stage.run([result(dep) for dep in stage.inputs], params)
+                    if use_cache:
+                        write_table(frame, path)
+            results[name] = frame
+            return frame
+
+        targets = targets or [self.order()[-1]]
+        return {name: result(name) for name in targets}
+
+# NAME=VALUE parameter overrides from the command line
+def parse_params(pairs):
+    params = dict()
+    for pair in pairs:
+        name, value = pair.split('=', 1)
+        if name not in PARAMS:
+            raise KeyError(f'unknown parameter {name}, expected one of {list(PARAMS)}')
+        params[name] = ast.literal_eval(value)
+    return params
+
+# main function
+def main():
+    # constants
+    FILENAME = r'./csv/raw_data.csv'
+
+    parser = argparse.ArgumentParser(description='Run the full data reduction pipeline in memory')
+    parser.add_argument('params', nargs='*', help='parameter overrides as NAME=VALUE')
+    parser.add_argument('--raw', default=FILENAME, help='raw GAIA catalog (CSV or columnar directory)')
+    parser.add_argument('--no-cache', action='store_true', help='recompute every stage')
+    args = parser.parse_args()
+
+    pipeline = Pipeline()
+    df = pipeline.run({'raw': args.raw}, parse_params(args.params), use_cache=not args.no_cache)['final']
+    print(f'Cluster members: {len(df)}')
+    df.to_csv('./csv/final.csv', index=False)
+
+if __name__ == '__main__':
+    main()
@@ -10,13 +10,14 @@ radius.py: Determines the optimal radius for the cluster
 '''
 
 # imports
+import argparse
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
-import heapq as hq
-from sklearn.linear_model import LinearRegression
-from scipy.stats import gaussian_kde
-from math import sqrt, atan, pi
+from sweep import nested_sweep, parallel_sweep
+from sky import angular_separation, central_star, RadialIndex
+from columnar import load_table, save_table
+from instrument import instrumented
+import figures
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -28,126 +29,52 @@ __email__ = 'rikghosh487@gmail.com'
 __status__ = 'Production'
 
 # globals
-NT = r'$N_t$'
-
-# assigns weight to each element in order to make a weighted graph data structure
-def graph_weight(dataframe):
-    graph = dict()
-    pmra = np.array(dataframe['pmra'])
-    pmdec = np.array(dataframe['pmdec'])
-    ids = np.array(dataframe['source_id'])
-
-    for i in range(len(dataframe)):
-        for j in range(i + 1, len(dataframe)):
-            # compute distance between two data points to store as edge weight
-            deltax = abs(pmra[i] - pmra[j])
-            deltay = abs(pmdec[i] - pmdec[j])
-            weight = sqrt(deltax ** 2. + deltay ** 2.)
-            if ids[i] not in graph:
-                graph.setdefault(ids[i], {})
-            graph.get(ids[i]).setdefault(ids[j], weight)
-            if ids[j] not in graph:
-                graph.setdefault(ids[j], {})
-            graph.get(ids[j]).setdefault(ids[i], weight)
-    return graph
-
-# simulates minimum spanning tree from a weighted graph and a starting vertex and displays average edge length
-def spanning_tree(graph, starting_vertex):
-    visited = set([starting_vertex])  # assigns starting_vertex as visited
-    edges = [(cost, starting_vertex, to) for to, cost in graph[starting_vertex].items()]
-    hq.heapify(edges)  # uses heap queue for MST
-
-    # initializing loop parameters
-    count = curr_cost = 0
-    avglen = [0]
-
-    # graph loop for Prim's Algorithm
-    while edges:
-        cost, frm, to = hq.heappop(edges)
-        # check for previously visited vertices to prevent cycles
-        if to not in visited:
-            curr_cost += cost
-            count += 1
-            avglen.append(curr_cost / count)  # computes average length of the MST per iteration
-            visited.add(to)
-            for to_next, cost in graph[to].items():
-                if to_next not in visited:
-                    hq.heappush(edges, (cost, to, to_next))
-    
-    x = np.linspace(0, len(graph) - 1, len(graph))  # x values for plotting
-    normx = list(map(lambda c: c / max(x), x))  # x values normalized for plotting
-    normlen = list(map(lambda c: c / max(avglen), avglen))   # y values normalized for plotting
-    return (normx, normlen)
-
-# determines the inclination angles of left-sided and right-sided lines of best fit to locate transition points
-def inclination_angle(nmin, xvals, yvals):
-    vals = list()
-    cangle = list()
-    fangle = list()
-    model = LinearRegression()
-
-    # span all possible points where Nmin < Nt < Ndat - Nmin
-    for i in range(nmin, len(xvals) - nmin):
-        # obtain all points for linear regression
-        xleft = np.array(xvals[i - nmin:i + 1]).reshape(-1, 1)
-        yleft = np.array(yvals[i - nmin:i + 1])
-        xright = np.array(xvals[i:i + nmin + 1]).reshape(-1, 1)
-        yright = np.array(yvals[i:i + nmin + 1])
-        vals.append(i)
-
-        # linear regression to find slope and compute angle of inclination
-        model.fit(xleft, yleft)
-        cangle.append(atan(model.coef_[0]) * 180 / pi)  # cluster angle
-        model.fit(xright, yright)
-        fangle.append(atan(model.coef_[0]) * 180 / pi)  # field angle
-    
-    return (vals, cangle, fangle)
+MAX_RAD = 40
+PROCESSES = 1  # worker processes for the radius sweep (None uses every core)
+COLUMNS = ['ra', 'dec', 'pmra', 'pmdec']  # columns used by the radius sweep
+
+# peak transition parameter of the stars within each radius around the central star
+@instrumented('radius_sweep')
+def sweep_radii(df, max_rad=MAX_RAD, processes=PROCESSES):
+    # the center is the star closest to the mean position, it also starts every spanning tree
+    start = central_star(df['ra'], df['dec'])
+    ra0, dec0 = df['ra'].iloc[start], df['dec'].iloc[start]
+    df = df.assign(dist=angular_separation(df['ra'], df['dec'], ra0, dec0))
+    index = RadialIndex(df['dist'])
+
+    xrange = np.arange(0, max_rad + 0.2, 0.2)   # x values for plot
+    if processes == 1:
+        # stars are added in order of distance and every VPD minimum spanning tree is built from the previous one
+        tparam = nested_sweep(df['pmra'], df['pmdec'], df['dist'], xrange, start)
+    else:
+        # independent radius steps spread across a process pool
+        tparam = parallel_sweep(df['pmra'], df['pmdec'], df['dist'], xrange, start, processes)
+    return (df, index, xrange, tparam)
+
+# covering radius (arcmin) at the peak transition parameter and the rows of the stars within it
+def covering_radius(df, max_rad=MAX_RAD, processes=PROCESSES):
+    df, index, xrange, tparam = sweep_radii(df, max_rad, processes)
+    rad = xrange[np.argmax(tparam)]
+    return (df, np.sort(index.within(rad)), rad)
+
+# keeps the stars within the covering radius
+@instrumented('select_radius')
+def select_radius(df, max_rad=MAX_RAD, processes=PROCESSES):
+    df, rows, _ = covering_radius(df, max_rad, processes)
+    return df.iloc[rows]
 
 # main function
 def main():
     # constants
     FILENAME = r'./csv/vpd_adj.csv'
-    MEAN_INDEX = 442
-    MAX_RAD = 40
+
+    parser = argparse.ArgumentParser(description='Determine the covering radius of the cluster')
+    parser.add_argument('--processes', type=int, default=PROCESSES, help='worker processes (1 runs the nested sweep)')
+    args = parser.parse_args()
 
     # dataframe
-    df = pd.read_csv(FILENAME)
-    cent_ra = df['ra'][MEAN_INDEX]
-    cent_dec = df['dec'][MEAN_INDEX]
-
-    # adding distance to dataframe
-    dist = list()
-    for i in range(len(df)):
-        dx = abs(df['ra'][i] - cent_ra)
-        dy = abs(df['dec'][i] - cent_dec)
-        dist.append(sqrt(dx ** 2. + dy ** 2.) * 60)
-    df['dist'] = dist
-
-    xrange = np.arange(0, MAX_RAD + 0.2, 0.2)   # x values for plot
-    tparam = list() # initalizing y value container
-
-    for elem in xrange:
-        small = df[df['dist'] < elem]
-        START_ID = 2013561830362788096
-        gr = graph_weight(small)
-        # calculate T parmater if data available
-        if gr:
-            normx, normlen = spanning_tree(gr, START_ID)
-            ndat = len(normx)
-            nmin = round(3 * sqrt(ndat))
-            xvals, cluster, field = inclination_angle(nmin, normx, normlen)
-            if cluster:
-                ALPHA_MAX = 90
-                DELTA = 0.01 * ALPHA_MAX
-                transition = list()
-                for i in range(len(cluster)):
-                    diff = field[i] - cluster[i]
-                    transition.append((diff / max(cluster[i], DELTA)) * (DELTA / ALPHA_MAX))
-                tparam.append(max(transition))
-            else:
-                tparam.append(0)
-        else:
-            tparam.append(0)
+    df = load_table(FILENAME, COLUMNS)
+    df, index, xrange, tparam = sweep_radii(df, processes=args.processes)
 
     s = np.std(tparam)
     eta_max = max(tparam)
@@ -157,12 +84,13 @@ def main():
     plt.xlabel(r'$R_s$' + ' (arcmin)')
     plt.ylabel(r'$\eta_{max}$')
     plt.title('Transition Parameter per Cluster Radii')
-    plt.show()
+    figures.show('radius_transition')
 
-    print(f'Covering Radius: {xrange[tparam.index(eta_max)]}')
+    print(f'Covering Radius: {xrange[np.argmax(tparam)]}')
 
-    df = df[df['dist'] < xrange[tparam.index(eta_max)]]
-    df.to_csv('./csv/final.csv', index=False)
+    rows = np.sort(index.within(xrange[np.argmax(tparam)]))
+    final = load_table(FILENAME).iloc[rows].assign(dist=df['dist'].iloc[rows].to_numpy())
+    save_table(final, './csv/final.csv')
 
 if __name__ == '__main__':
     main()
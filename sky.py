@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+'''
+sky.py: Angular distances on the celestial sphere and spatial indexes for radial selections
+
+        Angular separations are computed with the haversine formula over whole arrays, which stays
+        accurate for the arcminute scales of a cluster and includes the cos(dec) factor that a flat
+        sky distance misses. A radial index keeps the stars sorted by their distance from a center,
+        so the stars within any radius are a prefix found with a binary search. A cone index over
+        unit vectors answers the same query around arbitrary centers.
+'''
+
+# imports
+import numpy as np
+from scipy.spatial import cKDTree
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+ARCMIN = 60  # arcminutes per degree
+
+# angular separation (arcmin) between every position and a center, all given in degrees
+def angular_separation(ra, dec, ra0, dec0):
+    ra = np.radians(np.asarray(ra, dtype=float))
+    dec = np.radians(np.asarray(dec, dtype=float))
+    ra0 = np.radians(ra0)
+    dec0 = np.radians(dec0)
+    hav = np.sin((dec - dec0) / 2) ** 2 + np.cos(dec) * np.cos(dec0) * np.sin((ra - ra0) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))) * ARCMIN
+
+# unit vectors on the sphere for positions in degrees
+def unit_vectors(ra, dec):
+    ra = np.radians(np.asarray(ra, dtype=float))
+    dec = np.radians(np.asarray(dec, dtype=float))
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+# mean position (deg) of a set of stars taken on the sphere
+def mean_position(ra, dec):
+    x, y, z = unit_vectors(ra, dec).mean(axis=0)
+    return (np.degrees(np.arctan2(y, x)) % 360, np.degrees(np.arctan2(z, np.hypot(x, y))))
+
+# index of the star closest to the mean position of the sample
+def central_star(ra, dec):
+    ra0, dec0 = mean_position(ra, dec)
+    return int(np.argmin(angular_separation(ra, dec, ra0, dec0)))
+
+# stars sorted by their distance from a center so that radial selections are prefixes
+class RadialIndex:
+    def __init__(self, dist):
+        dist = np.asarray(dist, dtype=float)
+        self.order = np.argsort(dist, kind='stable')
+        self.dist = dist[self.order]
+
+    # number of stars closer than radius
+    def count(self, radius):
+        return np.searchsorted(self.dist, radius, side='left')
+
+    # row indices of the stars closer than radius, nearest first
+    def within(self, radius):
+        return self.order[:self.count(radius)]
+
+# KD-tree over unit vectors for cone selections around any center
+class ConeIndex:
+    def __init__(self, ra, dec):
+        self.tree = cKDTree(unit_vectors(ra, dec))
+
+    # row indices of the stars within radius (arcmin) of a center (deg)
+    def cone(self, ra0, dec0, radius):
+        chord = 2 * np.sin(np.radians(radius / ARCMIN) / 2)
+        return np.sort(self.tree.query_ball_point(unit_vectors(ra0, dec0)[0], chord))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+'''
+sweep.py: Nested radius sweep of the transition parameter
+
+          The samples of the radius sweep are nested, so the stars are added in order of their
+          distance from the center and the Vector Point Diagram (VPD) minimum spanning tree (MST) of
+          each sample is updated from the previous one. Every star is joined once, for the whole
+          sequence, to the nearest earlier star in each of 8 cones around it. The MST of the first n
+          stars only uses these edges, so each radius takes the old MST plus the cone edges of its
+          new stars, about 9 edges per new star, and Kruskal's algorithm gives the new MST. The visit
+          order of Prim's algorithm from the starting star, and so its average length curve, is read
+          off the tree without a heap. When several edges are exactly as long, the tree may differ
+          from the one Prim's algorithm picks over the whole triangulation, with the same length.
+          Radii that add no new stars reuse the previous value.
+
+          The radius steps are also independent of each other, so they can instead be spread
+          across a process pool. Only one task is sent for each distinct number of stars. The
+          distance sorted pmra and pmdec arrays are placed in shared memory once and every worker
+          reads them without a copy, so each task only sends its number of stars.
+'''
+
+# imports
+import numpy as np
+from multiprocessing import Pool
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, minimum_spanning_tree
+from emst import sector_edges, tree_order, average_length
+from sky import RadialIndex
+from core import SharedArrays, attach_shared, spanning_tree, transition_point
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+_shared = dict()  # arrays attached by each worker of the parallel sweep
+
+# minimum spanning tree of a growing prefix of a fixed sequence of points
+class PrefixMST:
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.n = 0
+
+        # coincident points hang from the first point at their position by a zero length edge
+        n = len(self.x)
+        order = np.lexsort((self.y, self.x))
+        same = np.zeros(n, dtype=bool)
+        same[1:] = (self.x[order][1:] == self.x[order][:-1]) & (self.y[order][1:] == self.y[order][:-1])
+        first = np.empty(n, dtype=np.intp)
+        first[order] = order[np.maximum.accumulate(np.where(same, 0, np.arange(n)))]
+        self.first = first  # earliest point at the position of every point
+
+        # cone edges of the distinct points, every new point brings the edges to its earlier neighbours
+        distinct = np.flatnonzero(first == np.arange(n))
+        later, earlier, weight = sector_edges(self.x[distinct], self.y[distinct])
+        self.later = distinct[later]
+        self.earlier = distinct[earlier]
+        self.cone_weight = weight
+        self.tree = csr_matrix((0, 0))
+
+    # adds the points up to n, the new MST is the MST of the old one and the cone edges of the new points
+    def grow(self, n):
+        prev = self.n
+        self.n = n
+        lo, hi = np.searchsorted(self.later, [prev, n])
+        tree = self.tree.tocoo()
+        frm = np.concatenate([tree.row, self.later[lo:hi]])
+        to = np.concatenate([tree.col, self.earlier[lo:hi]])
+        weight = np.concatenate([tree.data, self.cone_weight[lo:hi]])
+        self.tree = minimum_spanning_tree(csr_matrix((weight, (frm, to)), shape=(n, n)))
+
+    # Prim's visit order, parents and edge costs of the current tree from root
+    def visit(self, root=0):
+        n = self.n
+        root = int(self.first[root])
+        _, parent = breadth_first_order(self.tree, root, directed=False, return_predecessors=True)
+        parent = parent.astype(np.intp)
+        repeated = np.flatnonzero(self.first[:n] != np.arange(n))
+        parent[repeated] = self.first[repeated]
+        parent[root] = -1
+
+        cost = np.zeros(n)
+        child = np.flatnonzero(parent >= 0)
+        cost[child] = np.hypot(self.x[child] - self.x[parent[child]], self.y[child] - self.y[parent[child]])
+        order = tree_order(parent, cost, root)
+        return (order, parent, cost[order])
+
+# peak transition parameter of the VPD minimum spanning tree of the stars within each radius
+def nested_sweep(pmra, pmdec, dist, radii, start):
+    index = RadialIndex(dist)
+    order = index.order
+    pmra = np.asarray(pmra, dtype=float)[order]
+    pmdec = np.asarray(pmdec, dtype=float)[order]
+    root = int(np.flatnonzero(order == start)[0])  # position of the starting star in distance order
+
+    counts = index.count(radii)  # stars with dist < radius
+    tree = PrefixMST(pmra, pmdec)
+    tparam = np.zeros(len(radii))
+    last = eta = 0.
+    for k, n in enumerate(counts):
+        if n != last:
+            last = n
+            eta = 0.
+            if n > 1:
+                # the tree is still maintained while the starting star is outside the sample
+                tree.grow(n)
+                if root < n:
+                    _, _, cost = tree.visit(root)
+                    _, eta = transition_point(average_length(cost))
+        tparam[k] = eta
+    return tparam
+
+# peak transition parameter of the stars within every radius, computed in parallel worker processes
+def parallel_sweep(pmra, pmdec, dist, radii, start, processes=None):
+    index = RadialIndex(dist)
+    order = index.order
+    root = int(np.flatnonzero(order == start)[0])
+    columns = {
+        'pmra': np.asarray(pmra, dtype=float)[order],
+        'pmdec': np.asarray(pmdec, dtype=float)[order],
+    }
+
+    # radii with the same stars share one task, samples without the starting star stay at 0
+    counts = index.count(radii)
+    distinct = np.unique(counts[(counts > 1) & (counts > root)])
+    tparam = np.zeros(len(radii))
+    if not len(distinct):
+        return tparam
+
+    # copy the inputs to shared memory once instead of pickling them for every task
+    with SharedArrays(columns) as names:
+        with Pool(processes, initializer=_attach, initargs=(names, root)) as pool:
+            peaks = pool.map(_sample_peak, distinct.tolist(), chunksize=1)  # results come back in count order
+    computed = np.isin(counts, distinct)
+    tparam[computed] = np.array(peaks)[np.searchsorted(distinct, counts[computed])]
+    return tparam
+
+# maps the shared sweep arrays into a worker process
+def _attach(names, root):
+    attach_shared(names, _shared)
+    _shared['root'] = root
+
+# peak transition parameter of the n stars closest to the center
+def _sample_peak(n):
+    tree = spanning_tree(_shared['pmra'][:n], _shared['pmdec'][:n], _shared['root'])
+    return transition_point(tree.avglen)[1]
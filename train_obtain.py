@@ -7,17 +7,27 @@ train_obtain.py: Uses Random Forest Regressor to obtain Photometric Estimates fo
                  approximations. The Machine Learning model is first trained using an existing training
                  data set that contains both Spectroscopic and Photometric Data. Then the model is scored
                  using a test dataset to determine if the model is fit for approximations. Finally, the data
-                 with missing Spectroscopic information is fed into the model to estimate the missing values
+                 with missing Spectroscopic information is fed into the model to estimate the missing values.
+                 The forest is trained on every core and stored under a hash of the training data and
+                 its hyperparameters, so later runs load it instead of training again, and a prediction
+                 only mode scores new color tables with the most recently trained model.
 '''
 
 # imports
+import argparse
+import hashlib
+import os
+import joblib
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error
-from scipy.stats import gaussian_kde, norm
+from scipy.stats import norm
+from kde import point_density
+from instrument import instrumented, stage
+import figures
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -28,6 +38,66 @@ __maintainer__ = 'Rik Ghosh'
 __email__ = 'rikghosh487@gmail.com'
 __status__ = 'Production'
 
+# globals
+FEATURES = ['ug', 'gr', 'ri', 'iz']  # SDSS colors used by the model
+TARGET = 'feh'
+PARAMS = {'n_estimators': 163, 'random_state': 0}  # hyperparameters of the forest
+TEST_SIZE = 0.2
+SPLIT_SEED = 0  # fixed split so that a stored model is scored on the same test set
+MODEL_DIR = r'./models'
+LATEST = 'latest.txt'  # name of the most recently trained model in the store
+
+# hash of the training data, the split and the hyperparameters of the forest
+def model_key(df, params=PARAMS):
+    h = hashlib.sha256()
+    data = df[FEATURES + [TARGET]]
+    h.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    h.update(','.join(data.columns).encode())
+    h.update(f'{TEST_SIZE!r},{SPLIT_SEED!r}'.encode())
+    for name, value in sorted(params.items()):
+        h.update(f'{name}={value!r}'.encode())
+    return h.hexdigest()
+
+# colors and [Fe/H] of the training and test sets
+def split(df):
+    return train_test_split(df[FEATURES], np.array(df[TARGET]), test_size=TEST_SIZE, random_state=SPLIT_SEED)
+
+# fits the forest on all cores
+@instrumented('train')
+def train(x_train, y_train, params=PARAMS):
+    return RandomForestRegressor(n_jobs=-1, **params).fit(x_train, y_train)
+
+# path of a stored model
+def model_path(key, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f'forest-{key[:16]}.joblib')
+
+# loads a stored model, its arrays are memory mapped so that loading does not copy the trees
+def load_model(path):
+    return joblib.load(path, mmap_mode='r')
+
+# forest for a training table, loaded from the store when the same data and hyperparameters were trained before
+def load_or_train(df, params=PARAMS, model_dir=MODEL_DIR, retrain=False):
+    path = model_path(model_key(df, params), model_dir)
+    if not retrain and os.path.isfile(path):
+        model = load_model(path)
+    else:
+        x_train, _, y_train, _ = split(df)
+        model = train(x_train, y_train, params)
+        os.makedirs(model_dir, exist_ok=True)
+        joblib.dump(model, path)
+    with open(os.path.join(model_dir, LATEST), 'w') as f:
+        f.write(os.path.basename(path) + '\n')
+    return model
+
+# the most recently trained model of the store
+def latest_model(model_dir=MODEL_DIR):
+    with open(os.path.join(model_dir, LATEST)) as f:
+        return load_model(os.path.join(model_dir, f.read().strip()))
+
+# [Fe/H] estimates for a table of SDSS colors
+def predict(model, df):
+    return model.predict(df[FEATURES])
+
 # main function
 def main():
     # constants
@@ -38,28 +108,38 @@ def main():
     TITLE = 'Machine Learning Truth-to-Prediction Plot'
     LABEL = 'One-to-one Regression Line'
 
+    parser = argparse.ArgumentParser(description='Estimate [Fe/H] from SDSS colors with a random forest')
+    parser.add_argument('--predict', metavar='FILE', help='only score a color table with the stored model')
+    parser.add_argument('--output', help='CSV for the [Fe/H] estimates of --predict')
+    parser.add_argument('--retrain', action='store_true', help='train again even if the model is stored')
+    args = parser.parse_args()
+
+    # prediction only
+    if args.predict:
+        with stage('read_csv') as span:
+            df2 = span.output(pd.read_csv(args.predict).dropna())
+        y_pred = predict(latest_model(), df2)
+        print(f'Cluster Metallicity: {np.mean(y_pred)}')
+        if args.output:
+            df2.assign(**{TARGET: y_pred}).to_csv(args.output, index=False)
+        return
+
     # dataframes
-    df = pd.read_csv(PRIMARY_FILENAME)
-    df = df.dropna()
-    df2 = pd.read_csv(SECONDARY_FILENAME)
-    df2 = df2.dropna()
-
-    # extract y values
-    feh = np.array(df['feh'])
-    df = df.drop(['logg', 'teff', 'feh'], axis='columns')
-    
+    with stage('read_csv') as span:
+        df = span.output(pd.read_csv(PRIMARY_FILENAME).dropna())
+        df2 = pd.read_csv(SECONDARY_FILENAME).dropna()
+
     # photometric estimates
-    x_train, x_test, y_train, y_test = train_test_split(df, feh, test_size=0.2)
-    model = RandomForestRegressor(n_estimators=163)
-    model.fit(x_train, y_train)     # training model
-    y_pred = model.predict(x_test)  # predicting with test data
+    model = load_or_train(df, retrain=args.retrain)  # training model
+    _, x_test, _, y_test = split(df)
+    y_pred = predict(model, x_test)  # predicting with test data
 
     # density based coloring
     xy = np.vstack([y_test, y_pred])
-    z = gaussian_kde(xy)(xy)
+    z = point_density(xy)
 
     # plotting
-    plt.scatter(y_test, y_pred, c=z, marker='.')
+    figures.scatter(y_test, y_pred, c=z, marker='.')
     plt.plot(y_test, y_test, 'r-', label=LABEL)
     plt.text(min(y_test), max(y_pred) - OFFSET, f'RMSE: {round(mean_squared_error(y_test, y_pred), 4)}') # RMSE
     y_pls = [CPE + x for x in y_test]     # CPE lines
@@ -75,7 +155,7 @@ def main():
     plt.ylabel(r'$[Fe/H]_{RF}$')
     plt.legend(loc='best')
     plt.title(TITLE)
-    plt.show()
+    figures.show('train_truth')
 
     # histograms
     delta = y_pred - y_test
@@ -88,10 +168,10 @@ def main():
     plt.ylabel(r'$Counts$')
     plt.legend(loc='best')
     plt.title('Distribution of the differences between the true and derived quantities')
-    plt.show()
+    figures.show('train_residuals')
 
     # actual prediction
-    y_pred = model.predict(df2)
+    y_pred = predict(model, df2)
     print(f'Cluster Metallicity: {np.mean(y_pred)}')
     
 if __name__ == '__main__':
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+'''
+transition.py: Sliding window inclination angles used to locate the cluster to field transition point
+
+               Each window fit is a single feature least squares line, so its slope only depends on the
+               sums of x, y, x^2 and xy over the window. These sums are read from prefix (cumulative)
+               sums, which gives the slope of every left-sided and right-sided window in O(N) for the
+               whole curve instead of one regression per window position. The same prefix sums serve
+               every window size, and the windows of one size are shifted slices of them, so the
+               transition point of one curve is found for a whole grid of Nmin values at O(N) array
+               operations per value, which shows how much it depends on Nmin = 3 sqrt(Ndat).
+'''
+
+# imports
+import numpy as np
+from math import sqrt
+from instrument import instrumented
+import kernels
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Katherine Clark', 'Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+ALPHA_MAX = 90
+DELTA = 0.01 * ALPHA_MAX
+NMIN_FACTOR = 3  # Nmin = NMIN_FACTOR * sqrt(Ndat)
+
+# cumulative sums with a leading zero so that the sum over [a, b) is s[b] - s[a]
+def prefix_sums(values):
+    s = np.zeros(len(values) + 1)
+    np.cumsum(values, out=s[1:])
+    return s
+
+# least squares slopes of the windows [start, stop) for every pair of start and stop indices
+def window_slopes(sx, sy, sxx, sxy, start, stop):
+    if kernels.JIT:
+        return kernels.window_slopes(sx, sy, sxx, sxy, start, stop)
+    m = stop - start
+    x = sx[stop] - sx[start]
+    y = sy[stop] - sy[start]
+    xx = sxx[stop] - sxx[start]
+    xy = sxy[stop] - sxy[start]
+    num = m * xy - x * y
+    den = m * xx - x * x
+    # constant x values have no defined slope, LinearRegression reports 0 for them
+    return np.divide(num, den, out=np.zeros(len(m)), where=den != 0)
+
+# determines the inclination angles of left-sided and right-sided lines of best fit to locate transition points
+@instrumented('inclination_angle', arg=1)
+def inclination_angle(nmin, xvals, yvals):
+    xvals = np.asarray(xvals, dtype=float)
+    yvals = np.asarray(yvals, dtype=float)
+    sx = prefix_sums(xvals)
+    sy = prefix_sums(yvals)
+    sxx = prefix_sums(xvals * xvals)
+    sxy = prefix_sums(xvals * yvals)
+
+    # span all possible points where Nmin < Nt < Ndat - Nmin
+    vals = np.arange(nmin, max(len(xvals) - nmin, nmin))
+    cslope = window_slopes(sx, sy, sxx, sxy, vals - nmin, vals + 1)
+    fslope = window_slopes(sx, sy, sxx, sxy, vals, vals + nmin + 1)
+    cangle = np.arctan(cslope) * 180 / np.pi  # cluster angle
+    fangle = np.arctan(fslope) * 180 / np.pi  # field angle
+    return (vals, cangle, fangle)
+
+# dimensionless transition parameter at each point from the cluster and field angles
+def transition_parameter(cangle, fangle):
+    cangle = np.asarray(cangle, dtype=float)
+    diff = np.asarray(fangle, dtype=float) - cangle
+    return (diff / np.maximum(cangle, DELTA)) * (DELTA / ALPHA_MAX)
+
+# normalized Nt and average length curves of a minimum spanning tree as plotted against each other
+def normalize(avglen):
+    x = np.linspace(0, len(avglen) - 1, len(avglen))
+    return (x / np.max(x), np.asarray(avglen, dtype=float) / np.max(avglen))
+
+# Nmin of an average length curve with ndat points
+def window_size(ndat, factor=NMIN_FACTOR):
+    return round(factor * sqrt(ndat))
+
+# least squares slopes of the windows of m points that start at the positions a of the sums (a slice)
+def _shifted_slopes(sums, a, m):
+    sx, sy, sxx, sxy = (values[a] for values in sums)
+    ex, ey, exx, exy = (values[a.start + m:a.stop + m] for values in sums)
+    x = ex - sx
+    y = ey - sy
+    num = m * (exy - sxy) - x * y
+    den = m * (exx - sxx) - x * x
+    return np.divide(num, den, out=np.zeros(len(num)), where=den != 0)
+
+# transition point (Nt at the peak transition parameter) and peak transition parameter for every nmin
+@instrumented('transition_scan')
+def transition_scan(avglen, nmins):
+    nmins = np.atleast_1d(np.asarray(nmins, dtype=np.int64))
+    points = np.zeros(len(nmins), dtype=np.int64)
+    peaks = np.zeros(len(nmins))
+    if len(avglen) < 2:
+        return (points, peaks)
+    xvals, yvals = normalize(avglen)
+    sums = (prefix_sums(xvals), prefix_sums(yvals), prefix_sums(xvals * xvals), prefix_sums(xvals * yvals))
+
+    # the windows of every scale are shifted slices of the same prefix sums, Nmin <= Nt < Ndat - Nmin
+    n = len(xvals)
+    for k, nmin in enumerate(nmins.tolist()):
+        if n - nmin <= nmin:
+            continue
+        cslope = _shifted_slopes(sums, slice(0, n - 2 * nmin), nmin + 1)  # windows [Nt - Nmin, Nt]
+        fslope = _shifted_slopes(sums, slice(nmin, n - nmin), nmin + 1)  # windows [Nt, Nt + Nmin]
+        cangle = np.arctan(cslope) * 180 / np.pi
+        fangle = np.arctan(fslope) * 180 / np.pi
+        eta = transition_parameter(cangle, fangle)
+        best = int(np.argmax(eta))
+        points[k] = nmin + best
+        peaks[k] = eta[best]
+    return (points, peaks)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+'''
+validation.py: K-fold cross validation of the metallicity forest at every number of trees
+
+               Every fold grows a single forest with warm start in steps of trees, and only the new
+               trees of a step predict the held out stars. A random forest predicts the mean of its
+               trees, so running sums of the tree predictions give the prediction, the RMSE and the
+               catastrophic prediction error rate (CPER, the fraction of stars off by more than the
+               0.75 dex CPE) of the forest at every size from 1 tree up in one pass, instead of one
+               fit per candidate size. The folds run in parallel worker processes that read the
+               training colors and [Fe/H] from shared memory.
+'''
+
+# imports
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from multiprocessing import Pool
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold
+from train_obtain import FEATURES, TARGET, PARAMS, SPLIT_SEED
+from core import SharedArrays, attach_shared
+import figures
+
+__author__ = 'Rik Ghosh'
+__copyright__ = 'Copyright 2021, The University of Texas at Austin'
+__credits__ = ['Soham Saha', 'Mihir Suvarna']
+__license__ = 'MIT'
+__version__ = '1.0.0'
+__maintainer__ = 'Rik Ghosh'
+__email__ = 'rikghosh487@gmail.com'
+__status__ = 'Production'
+
+# globals
+FOLDS = 5
+MAX_TREES = 400
+STEP = 20  # trees added to the forest per warm start
+CPE = 0.75  # dex
+_shared = dict()  # arrays attached by each worker
+
+# RMSE and CPER on the test rows of a forest grown on the train rows, at every number of trees
+def fold_curves(X, y, train, test, max_trees=MAX_TREES, step=STEP, params=None):
+    params = {name: value for name, value in (params or PARAMS).items() if name != 'n_estimators'}
+    model = RandomForestRegressor(n_estimators=0, warm_start=True, n_jobs=1, **params)
+    total = np.zeros(len(test))
+    rmse = np.empty(max_trees)
+    cper = np.empty(max_trees)
+    x_test = X[test]
+    y_test = y[test]
+    for size in range(step, max_trees + step, step):
+        done = len(model.estimators_) if hasattr(model, 'estimators_') else 0
+        model.n_estimators = min(size, max_trees)
+        model.fit(X[train], y[train])
+        for k, tree in enumerate(model.estimators_[done:], start=done):
+            total += tree.predict(x_test)
+            error = total / (k + 1) - y_test
+            rmse[k] = np.sqrt(np.mean(error ** 2))
+            cper[k] = np.mean(np.abs(error) > CPE)
+    return (rmse, cper)
+
+# cross validated RMSE and CPER for every number of trees, one worker process per fold
+def cross_validate(X, y, folds=FOLDS, max_trees=MAX_TREES, step=STEP, params=None, processes=None):
+    tasks = [(fold, folds, max_trees, step, params) for fold in range(folds)]
+    with SharedArrays({'X': X, 'y': y}) as names:
+        with Pool(processes, initializer=_attach, initargs=(names,)) as pool:
+            curves = pool.map(_fold, tasks, chunksize=1)
+
+    rmse = np.array([curve[0] for curve in curves])
+    cper = np.array([curve[1] for curve in curves])
+    return pd.DataFrame({
+        'n_estimators': np.arange(1, max_trees + 1),
+        'rmse': rmse.mean(axis=0),
+        'rmse_std': rmse.std(axis=0),
+        'cper': cper.mean(axis=0),
+        'cper_std': cper.std(axis=0),
+    })
+
+# maps the shared training arrays into a worker process
+def _attach(names):
+    attach_shared(names, _shared)
+
+# curves of one fold, the folds are the same in every worker
+def _fold(task):
+    fold, folds, max_trees, step, params = task
+    X = _shared['X']
+    train, test = list(KFold(folds, shuffle=True, random_state=SPLIT_SEED).split(X))[fold]
+    return fold_curves(X, _shared['y'], train, test, max_trees, step, params)
+
+# main function
+def main():
+    # constants
+    FILENAME = r'./csv/segue.csv'
+    OUTPUT = r'./csv/validation.csv'
+
+    parser = argparse.ArgumentParser(description='Cross validate the metallicity forest at every number of trees')
+    parser.add_argument('--folds', type=int, default=FOLDS, help='number of folds')
+    parser.add_argument('--max-trees', type=int, default=MAX_TREES, help='largest forest')
+    parser.add_argument('--step', type=int, default=STEP, help='trees added per warm start')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (every core by default)')
+    args = parser.parse_args()
+
+    df = pd.read_csv(FILENAME).dropna()
+    curves = cross_validate(df[FEATURES], df[TARGET], args.folds, args.max_trees, args.step,
+                            processes=args.processes)
+    curves.to_csv(OUTPUT, index=False)
+    best = curves.loc[curves['rmse'].idxmin()]
+    print(f'Lowest RMSE: {best["rmse"]:.4f} at {int(best["n_estimators"])} trees (CPER {best["cper"]:.4f})')
+
+    # plotting
+    fig, ax = plt.subplots()
+    ax.plot(curves['n_estimators'], curves['rmse'], 'r-', label='RMSE')
+    ax.fill_between(curves['n_estimators'], curves['rmse'] - curves['rmse_std'],
+                    curves['rmse'] + curves['rmse_std'], color='r', alpha=0.2)
+    ax.set_xlabel('Trees')
+    ax.set_ylabel('RMSE (dex)')
+    twin = ax.twinx()
+    twin.plot(curves['n_estimators'], curves['cper'], 'b--', label='CPER')
+    twin.set_ylabel('CPER')
+    fig.legend(loc='upper right')
+    plt.title(f'{args.folds}-fold Cross Validation of the Random Forest')
+    figures.show('validation_curves', fig)
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,18 @@
 view.py: View the histograms and scatterplots for the data in the CSV
 
          A dataframe is created from the CSV and the parameters are displayed through histograms
-         and scatterplots
+         and scatterplots. The figures are independent of each other, so when they are written to
+         disk (see figures.py) they are drawn in parallel worker processes.
 '''
 
 # imports
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 from scipy.spatial import ConvexHull
-from scipy.stats import gaussian_kde, norm
+from scipy.stats import norm
+from columnar import load_table
+from kde import point_density
+import figures
 
 __author__ = 'Rik Ghosh'
 __copyright__ = 'Copyright 2021, The University of Texas at Austin'
@@ -23,120 +26,52 @@ __maintainer__ = 'Rik Ghosh'
 __email__ = 'rikghosh487@gmail.com'
 __status__ = 'Production'
 
-# main function
-def main():
-    # constants
-    FILENAME = r'./csv/final.csv'
-    BINS = 50
-    HIST_Y_LABEL = 'Count'
-    CURVE_LABEL = 'Gaussian Fit'
-
-    # dataframe
-    df = pd.read_csv(FILENAME)
-
-    '''HISTOGRAMS'''
-    # ra
-    x = np.array(df['ra'])
-    hist, bins, _ = plt.hist(x, BINS, histtype='step', label='Counts')  # generate plot
-    m = np.mean(x)
-    s = np.std(x)
-    p = norm.pdf(bins, m, s) # generate pdf
-    plt.plot(bins, p / p.sum() * len(df), 'r--', label=CURVE_LABEL)
-    plt.axvline(m, color='k', linestyle='-.', label='Mean')
-    plt.xlabel(r'$\alpha$ (deg)')
-    plt.ylabel(HIST_Y_LABEL)
-    plt.legend(loc='best')
-    plt.title(r'Right Ascension ($\alpha$) Histogram')
-    plt.show()
-
-    # dec
-    x = np.array(df['dec'])
-    hist, bins, _ = plt.hist(x, BINS, histtype='step', label='Counts')  # generate plot
-    m = np.mean(x)
-    s = np.std(x)
-    p = norm.pdf(bins, m, s) # generate pdf
-    plt.plot(bins, p / p.sum() * len(df), 'r--', label=CURVE_LABEL)
-    plt.axvline(m, color='k', linestyle='-.', label='Mean')
-    plt.xlabel(r'$\delta$ (deg)')
-    plt.ylabel(HIST_Y_LABEL)
-    plt.legend(loc='best')
-    plt.title(r'Declination ($\delta$) Histogram')
-    plt.show()
+# globals
+BINS = 50
+HIST_Y_LABEL = 'Count'
+CURVE_LABEL = 'Gaussian Fit'
 
-    # pmra
-    x = np.array(df['pmra'])
-    hist, bins, _ = plt.hist(x, BINS, histtype='step', label=CURVE_LABEL)  # generate plot
+# histogram of one parameter with a gaussian fit and its mean
+def histogram(x, xlabel, title, label='Counts'):
+    hist, bins, _ = plt.hist(x, BINS, histtype='step', label=label)  # generate plot
     m = np.mean(x)
     s = np.std(x)
     p = norm.pdf(bins, m, s) # generate pdf
-    plt.plot(bins, p / p.sum() * len(df), 'r--', label=CURVE_LABEL)
+    plt.plot(bins, p / p.sum() * len(x), 'r--', label=CURVE_LABEL)
     plt.axvline(m, color='k', linestyle='-.', label='Mean')
-    plt.xlabel(r'$\mu_{\alpha} cos(\delta)$ (mas/yr)')
+    plt.xlabel(xlabel)
     plt.ylabel(HIST_Y_LABEL)
     plt.legend(loc='best')
-    plt.title(r'Proper Motion in Right Ascension ($\mu_{\alpha*}$) Histogram')
-    plt.show()
+    plt.title(title)
 
-    # pmdec
-    x = np.array(df['pmdec'])
-    hist, bins, _ = plt.hist(x, BINS, histtype='step', label='Counts')  # generate plot
-    m = np.mean(x)
-    s = np.std(x)
-    p = norm.pdf(bins, m, s) # generate pdf
-    plt.plot(bins, p / p.sum() * len(df), 'r--', label=CURVE_LABEL)
-    plt.axvline(m, color='k', linestyle='-.', label='Mean')
-    plt.xlabel(r'$\mu_{\delta}$ (mas/yr)')
-    plt.ylabel(HIST_Y_LABEL)
-    plt.legend(loc='best')
-    plt.title(r'Proper Motion in Declination ($\mu_{\delta}$) Histogram')
-    plt.show()
-
-    # parallax
-    x = np.array(df['parallax'])
-    hist, bins, _ = plt.hist(x, BINS, histtype='step', label='Counts')  # generate plot
-    m = np.mean(x)
-    s = np.std(x)
-    p = norm.pdf(bins, m, s)
-    plt.plot(bins, p / p.sum() * len(df), 'r--', label=CURVE_LABEL)
-    plt.axvline(m, color='k', linestyle='-.', label='Mean')
-    plt.xlabel(r'$\pi$ (mas)')
-    plt.ylabel(HIST_Y_LABEL)
-    plt.legend(loc='best')
-    plt.title(r'Parallax ($\pi$) Histogram')
-    plt.show()
-
-    # correlation
-    plt.hist(df['pmra_pmdec_corr'], BINS, histtype='step', label='Pmra Pmdec')
-    plt.hist(df['parallax_pmra_corr'], BINS, histtype='step', label='Parallax Pmra')
-    plt.hist(df['parallax_pmdec_corr'], BINS, histtype='step', label='Parallax Pmdec')
+# histograms of the correlation coefficients
+def correlation(pmra_pmdec, parallax_pmra, parallax_pmdec):
+    plt.hist(pmra_pmdec, BINS, histtype='step', label='Pmra Pmdec')
+    plt.hist(parallax_pmra, BINS, histtype='step', label='Parallax Pmra')
+    plt.hist(parallax_pmdec, BINS, histtype='step', label='Parallax Pmdec')
     plt.xlabel('Correlation')
     plt.ylabel(HIST_Y_LABEL)
     plt.legend(loc='best')
     plt.title('Correlation Coefficients')
-    plt.show()
 
-    '''SCATTERPLOTS'''
-    # spatial position
-    x = np.array(df['ra'])
-    y = np.array(df['dec'])
+# spatial position colored by density
+def spatial(x, y):
     xy = np.vstack([x, y])
-    z = gaussian_kde(xy)(xy)
-    plt.scatter(x, y, c=z, marker='.') # plotting
+    z = point_density(xy)
+    figures.scatter(x, y, c=z, marker='.') # plotting
     plt.plot(np.mean(x), np.mean(y), 'r*', label='Mean')
     plt.xlabel(r'$\alpha$ (deg)')
     plt.ylabel(r'$\delta$ (deg)')
     plt.legend(loc='best')
     plt.title('Spatial Structure in ICRS')
-    plt.show()
 
-    # vpd
-    x = np.array(df['pmra'])
-    y = np.array(df['pmdec'])
+# vector point diagram colored by density with its convex hull
+def vpd(x, y):
     xy = np.vstack([x, y])
-    z = gaussian_kde(xy)(xy)
+    z = point_density(xy)
     s = xy.T
     hull = ConvexHull(s)
-    plt.scatter(x, y, c=z, marker='.') # plotting
+    figures.scatter(x, y, c=z, marker='.') # plotting
     plt.plot(np.mean(x), np.mean(y), 'r*', label='Mean')
     plt.xlabel(r'$\mu_{\alpha} cos(\delta)$ (mas/yr)')
     plt.ylabel(r'$\mu_{\delta}$ (mas/yr)')
@@ -144,18 +79,44 @@ def main():
         plt.plot(s[simplex, 0], s[simplex, 1], 'k-')
     plt.legend(loc='best')
     plt.title('Vector Point Diagram')
-    plt.show()
 
-    # cmd
-    x = np.array(df['bp_rp'])
-    y = np.array(df['phot_g_mean_mag'])
+# color magnitude diagram
+def cmd(x, y):
     plt.gca().invert_yaxis()
-    plt.scatter(x, y, marker='.', label='Datapoint')
+    figures.scatter(x, y, marker='.', label='Datapoint')
     plt.xlabel(r'$B_P - R_P$ (mag)')
     plt.ylabel(r'$G$ (mag)')
     plt.legend(loc='best')
     plt.title('Color Magnitude Diagram')
-    plt.show()
+
+# main function
+def main():
+    # constants
+    FILENAME = r'./csv/final.csv'
+    COLUMNS = ['ra', 'dec', 'pmra', 'pmdec', 'parallax', 'pmra_pmdec_corr', 'parallax_pmra_corr',
+               'parallax_pmdec_corr', 'bp_rp', 'phot_g_mean_mag']
+
+    # dataframe
+    df = load_table(FILENAME, COLUMNS)
+    col = {name: np.array(df[name]) for name in COLUMNS}
+
+    jobs = [
+        # histograms
+        ('view_ra', histogram, (col['ra'], r'$\alpha$ (deg)', r'Right Ascension ($\alpha$) Histogram')),
+        ('view_dec', histogram, (col['dec'], r'$\delta$ (deg)', r'Declination ($\delta$) Histogram')),
+        ('view_pmra', histogram, (col['pmra'], r'$\mu_{\alpha} cos(\delta)$ (mas/yr)',
+                                  r'Proper Motion in Right Ascension ($\mu_{\alpha*}$) Histogram', CURVE_LABEL)),
+        ('view_pmdec', histogram, (col['pmdec'], r'$\mu_{\delta}$ (mas/yr)',
+                                   r'Proper Motion in Declination ($\mu_{\delta}$) Histogram')),
+        ('view_parallax', histogram, (col['parallax'], r'$\pi$ (mas)', r'Parallax ($\pi$) Histogram')),
+        ('view_correlation', correlation, (col['pmra_pmdec_corr'], col['parallax_pmra_corr'],
+                                           col['parallax_pmdec_corr'])),
+        # scatterplots
+        ('view_spatial', spatial, (col['ra'], col['dec'])),
+        ('view_vpd', vpd, (col['pmra'], col['pmdec'])),
+        ('view_cmd', cmd, (col['bp_rp'], col['phot_g_mean_mag'])),
+    ]
+    figures.render(jobs)
 
 if __name__ == '__main__':
     main()